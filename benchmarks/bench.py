@@ -0,0 +1,236 @@
+"""
+Offline benchmark suite for the cogs and the storage layer. It runs the handlers against fake Discord
+objects and a synthetic bot.db, so no bot token or gateway connection is needed. Requires py-cord to be
+installed, since the cogs import it.
+
+Usage:
+    python benchmarks/bench.py --populations 1000,10000,100000,1000000 --output bench_results.json
+    python benchmarks/bench.py --compare old_results.json
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from pathlib import Path
+
+# The bot resolves bot.db and the Localization folder relative to sys.path[0], so the repository root
+# has to come first.
+root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root))
+
+from benchmarks.fakes import FakeUser, FakeChannel, FakeContext, FakeInteraction, FakeGuild, FakeBot
+from utils.database import db
+from utils.settings import settings
+from utils.startup import StartupTimes, percentile
+from utils.migrations import migrate
+
+def seed(con, population:int, profile_ratio:float = 0.5):
+    """
+    The function fills the `aboutme` table with synthetic profiles for `profile_ratio` of the users.
+    """
+    rng = random.Random(population)
+    def rows():
+        for user_id in range(1, population + 1):
+            if rng.random() >= profile_ratio:
+                continue
+            yield (user_id, 'name', f'User {user_id}', 1)
+            yield (user_id, 'birthday', f'{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(1960, 2010)}', 1)
+            yield (user_id, 'country', rng.choice(('Germany', 'Austria', 'USA', 'Japan')), 1)
+            yield (user_id, 'hobbies', rng.choice(('chess', 'hiking', 'coding', 'music')), rng.random() > 0.1)
+    with con:
+        if con.execute("SELECT 1 FROM sqlite_master WHERE name = 'aboutme_guilds'").fetchone():
+            # Everyone shares guild 1, guild 2 is a small server with every 100th user. Seeded first, so the
+            # search index picks the guilds up when the profiles are inserted.
+            con.executemany('INSERT OR IGNORE INTO aboutme_guilds (user_id, guild_id) VALUES (?,?)',
+                            ((user_id, guild_id) for user_id in range(1, population + 1) for guild_id in ((1, 2) if user_id % 100 == 0 else (1,))))
+        con.executemany('INSERT OR REPLACE INTO aboutme (user_id, info, value, toggle) VALUES (?,?,?,?)', rows())
+        if con.execute("SELECT 1 FROM sqlite_master WHERE name = 'birthdays'").fetchone():
+            con.execute("""INSERT OR REPLACE INTO birthdays (user_id, year, month, day)
+                           SELECT user_id, CAST(substr(value, 7, 4) AS INTEGER), CAST(substr(value, 4, 2) AS INTEGER), CAST(substr(value, 1, 2) AS INTEGER)
+                           FROM aboutme WHERE info = 'birthday'""")
+
+async def measure(name:str, population:int, func, iterations:int) -> dict:
+    """
+    The function awaits `func(i)` `iterations` times and summarizes the latencies in milliseconds.
+    """
+    samples = []
+    for i in range(iterations):
+        t = time.perf_counter()
+        result = func(i)
+        if asyncio.iscoroutine(result):
+            await result
+        samples.append((time.perf_counter() - t) * 1000)
+    total = sum(samples)
+    return {
+        'benchmark': name,
+        'population': population,
+        'iterations': iterations,
+        'mean_ms': round(total / iterations, 4),
+        'p50_ms': round(percentile(samples, 50), 4),
+        'p95_ms': round(percentile(samples, 95), 4),
+        'max_ms': round(max(samples), 4),
+        'ops_per_s': round(iterations / (total / 1000), 1) if total else None,
+    }
+
+async def loop_lag(population:int, writers:int = 20, rows:int = 2000) -> dict:
+    """
+    The function runs heavy concurrent database traffic while probing how late the event loop wakes up,
+    and returns the worst observed lag.
+    """
+    lag = 0.0
+    done = False
+    async def probe():
+        nonlocal lag
+        while not done:
+            t = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lag = max(lag, time.perf_counter() - t - 0.001)
+    task = asyncio.create_task(probe())
+    await db.execute('CREATE TABLE IF NOT EXISTS bench_lag (a INTEGER, b TEXT)')
+    await asyncio.gather(
+        *(db.executemany('INSERT INTO bench_lag (a, b) VALUES (?,?)', ((i, 'x' * 32) for i in range(rows))) for _ in range(writers)),
+        *(db.query('SELECT COUNT(*) FROM aboutme WHERE info = ?', ('country',)) for _ in range(writers * 5)),
+    )
+    done = True
+    await task
+    await db.execute('DROP TABLE bench_lag')
+    return {'benchmark': 'event loop lag under db load', 'population': population, 'max_lag_ms': round(lag * 1000, 3)}
+
+async def run_population(population:int, iterations:int) -> list:
+    import discord
+    import cogs.aboutme as aboutme
+    import cogs.generalutility as generalutility
+
+    results = []
+    rng = random.Random(0)
+    users = lambda: FakeUser(rng.randint(1, population))
+
+    results.append(await measure('Settings.load', population, lambda i: settings.load(), iterations))
+    startup = StartupTimes(db)
+    results.append(await measure('StartupTimes.record_boot', population, lambda i: startup.record_boot({'import': 1.0, 'ready': 2.0, 'total': 3.0}), min(iterations, 50)))
+    results.append(await measure('StartupTimes.phase_stats', population, lambda i: startup.phase_stats(), iterations))
+
+    loc = aboutme.Localization
+    results.append(await measure('Localization lookup', population, lambda i: loc(('de', 'en-US', 'de-DE')[i % 3]).addselect.placeholder, iterations * 10))
+
+    bot = FakeBot(users=[FakeUser(i) for i in range(1, population + 1)])
+    t = time.perf_counter()
+    social = aboutme.Social(bot)
+    results.append({'benchmark': 'Social cog load', 'population': population, 'iterations': 1, 'mean_ms': round((time.perf_counter() - t) * 1000, 4)})
+    if hasattr(aboutme.Social, 'on_ready'):
+        results.append(await measure('Social.on_ready backfill', population, lambda i: aboutme.Social.on_ready(social), 1))
+
+    if hasattr(aboutme, 'profile_cache'):
+        aboutme.profile_cache.clear()
+    results.append(await measure('create_aboutme_embed (cold)', population, lambda i: aboutme.create_aboutme_embed(users()), iterations))
+    hot = [FakeUser(i) for i in range(1, 51)]
+    results.append(await measure('create_aboutme_embed (hot)', population, lambda i: aboutme.create_aboutme_embed(hot[i % len(hot)]), iterations))
+    results.append(await measure('ConfigAboutme construction', population, lambda i: aboutme.ConfigAboutme.create(users().id), iterations))
+    if hasattr(aboutme.ConfigAboutme, 'set_toggle'):
+        async def toggle(i):
+            user = users()
+            view = await aboutme.ConfigAboutme.create(user.id)
+            await view.set_toggle(aboutme.infos[i % len(aboutme.infos)], i % 2, FakeInteraction(user))
+        results.append(await measure('ConfigAboutme toggle', population, toggle, iterations))
+
+    async def submit(i):
+        user = users()
+        modal = await aboutme.AboutModal.create(user.id)
+        for child in modal.children:
+            if isinstance(child, discord.ui.InputText):
+                child.value = f'{i % 28 + 1:02d}.{i % 12 + 1:02d}.1990' if child.custom_id == 'birthday' else f'value {i}'
+        await aboutme.AboutModal.aboutmodal_callback(modal, FakeInteraction(user))
+    results.append(await measure('AboutModal submit', population, submit, iterations))
+
+    if hasattr(aboutme, 'load_birthdays'):
+        import datetime
+        days = [datetime.date(2024, 1, 1) + datetime.timedelta(days=d) for d in range(366)]
+        for guild_id, label in ((1, 'large guild'), (2, 'small guild')):
+            results.append(await measure(f'birthdays in the next 7 days ({label})', population, lambda i: db.run(aboutme.load_birthdays, guild_id, days[i % len(days)], 7), iterations))
+
+    if hasattr(aboutme, 'search_profiles'):
+        # Pages start at random depths, a keyset page should cost the same everywhere.
+        words = ('chess', 'hik', 'germany', 'user 4')
+        for guild_id, label in ((1, 'large guild'), (2, 'small guild')):
+            results.append(await measure(f'aboutme search page ({label})', population, lambda i: db.run(aboutme.search_profiles, aboutme.fts_query(words[i % len(words)]), guild_id, rng.randint(0, population * 2), aboutme.SearchView.page_size), iterations))
+
+    cog = generalutility.GeneralUtility(None)
+    if hasattr(generalutility, 'outbound'):
+        # The fake channels have no rate limits, so the purge is measured without pacing.
+        generalutility.outbound.route_limits = dict.fromkeys(generalutility.outbound.route_limits)
+        generalutility.outbound.default_limit = None
+    clear = generalutility.GeneralUtility.clear_msgs.callback
+    for amount, old_every in ((100, 0), (1000, 0), (1000, 4)):
+        channels = []
+        async def purge(i):
+            channel = FakeChannel(amount, old_every)
+            channels.append(channel)
+            await clear(cog, FakeContext(users(), channel=channel, guild=FakeGuild()), amount)
+            # The handler logs and swallows its errors, a short count means the run is not valid.
+            assert channel.deleted == amount, f'clear_msgs deleted {channel.deleted} of {amount} messages'
+        entry = await measure(f'clear_msgs {amount} ({"25% old" if old_every else "all young"})', population, purge, max(1, iterations // 20))
+        entry['api_calls'] = channels[-1].api_calls
+        entry['deleted'] = channels[-1].deleted
+        results.append(entry)
+
+    social.cog_unload()
+    results.append(await loop_lag(population))
+    return results
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+def compare(old:dict, new:dict):
+    """
+    The function prints the relative change of the mean latency per benchmark and population.
+    """
+    before = {(r['benchmark'], r['population']): r for r in old['results']}
+    for r in new['results']:
+        o = before.get((r['benchmark'], r['population']))
+        key = 'max_lag_ms' if 'max_lag_ms' in r else 'mean_ms'
+        if o is None or not o.get(key):
+            continue
+        change = (r[key] - o[key]) / o[key] * 100
+        print(f'{r["benchmark"]:<40}{r["population"]:>9}{o[key]:>12.3f}{r[key]:>12.3f}{change:>+9.1f}%')
+
+async def main(args):
+    output = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'timestamp': time.time(),
+        'results': [],
+    }
+    for population in args.populations:
+        with tempfile.TemporaryDirectory() as tmp:
+            db.close()
+            db.db_path = Path(tmp, 'bot.db')
+            db.run_sync(migrate)
+            t = time.perf_counter()
+            db.run_sync(seed, population)
+            print(f'seeded {population} users in {time.perf_counter() - t:.1f}s')
+            for result in await run_population(population, args.iterations):
+                print(json.dumps(result))
+                output['results'].append(result)
+            db.close()
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=4)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), output)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--populations', default='1000,10000,100000,1000000', type=lambda s: [int(p) for p in s.split(',')])
+    parser.add_argument('--iterations', default=200, type=int)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', default=None, help='results file of an earlier run to compare against')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,139 @@
+"""
+Lightweight stand-ins for the Discord objects the cogs touch, so handlers can be benchmarked without a
+gateway connection or bot token. Only the attributes and coroutines the cogs actually use exist.
+"""
+
+import asyncio
+import datetime
+import itertools
+
+class FakeUser:
+    def __init__(self, user_id:int, name:str = None):
+        self.id = user_id
+        self.name = name or f'user{user_id}'
+        self.display_name = self.name
+        self.avatar = None
+        self.bot = False
+        self.roles = []
+
+    @property
+    def mention(self):
+        return f'<@{self.id}>'
+
+class FakeMessage:
+    def __init__(self, message_id:int, channel, created_at:datetime.datetime, author=None):
+        self.id = message_id
+        self.channel = channel
+        self.created_at = created_at
+        self.author = author
+
+    async def delete(self, *, delay=None, reason=None):
+        self.channel.deleted += 1
+        self.channel.api_calls += 1
+
+class FakeChannel:
+    def __init__(self, message_count:int = 0, old_every:int = 0, channel_id:int = 1):
+        """
+        The function creates a channel holding `message_count` messages, newest first. If `old_every`
+        is set, every message after the first `message_count // old_every` is older than 14 days.
+        """
+        self.id = channel_id
+        self.deleted = 0
+        self.api_calls = 0
+        now = datetime.datetime.now(datetime.timezone.utc)
+        young = message_count - message_count // old_every if old_every else message_count
+        self.messages = [
+            FakeMessage(i, self, now - datetime.timedelta(minutes=i) if i < young else now - datetime.timedelta(days=30, minutes=i))
+            for i in range(message_count)
+        ]
+
+    async def history(self, limit=100, **kwargs):
+        for i, msg in enumerate(self.messages):
+            if limit is not None and i >= limit:
+                break
+            if i % 100 == 0:
+                self.api_calls += 1
+            yield msg
+
+    async def delete_messages(self, messages, *, reason=None):
+        self.deleted += len(messages)
+        self.api_calls += 1
+
+    async def send(self, *args, **kwargs):
+        self.api_calls += 1
+        return FakeMessage(len(self.messages), self, datetime.datetime.now(datetime.timezone.utc))
+
+    def get_partial_message(self, message_id:int):
+        return FakeMessage(message_id, self, datetime.datetime.now(datetime.timezone.utc))
+
+class FakeResponse:
+    def __init__(self):
+        self.calls = []
+
+    async def send_message(self, *args, **kwargs):
+        self.calls.append(('send_message', args, kwargs))
+
+    async def edit_message(self, *args, **kwargs):
+        self.calls.append(('edit_message', args, kwargs))
+
+    async def defer(self, *args, **kwargs):
+        self.calls.append(('defer', args, kwargs))
+
+    def is_done(self):
+        return bool(self.calls)
+
+class FakeInteraction:
+    ids = itertools.count(1)
+
+    def __init__(self, user:FakeUser, locale:str = 'en-US', guild=None, channel=None):
+        self.id = next(self.ids)
+        self.user = user
+        self.locale = locale
+        self.guild = guild
+        self.guild_id = guild.id if guild is not None else None
+        self.channel = channel
+        self.response = FakeResponse()
+        self.edits = []
+
+    async def edit_original_response(self, **kwargs):
+        self.edits.append(kwargs)
+
+class FakeGuild:
+    def __init__(self, guild_id:int = 1, members=()):
+        self.id = guild_id
+        self.name = f'guild{guild_id}'
+        self.members = list(members)
+        self.icon = None
+
+class FakeContext:
+    def __init__(self, author:FakeUser, locale:str = 'en-US', channel:FakeChannel = None, guild:FakeGuild = None):
+        self.author = author
+        self.user = author
+        self.locale = locale
+        self.channel = channel or FakeChannel()
+        self.guild = guild
+        self.guild_id = guild.id if guild is not None else None
+        self.interaction = FakeInteraction(author, locale, guild, self.channel)
+        self.responses = []
+
+    async def defer(self, *args, **kwargs):
+        self.responses.append(('defer', args, kwargs))
+
+    async def respond(self, *args, **kwargs):
+        self.responses.append(('respond', args, kwargs))
+
+    async def send_modal(self, modal):
+        self.responses.append(('send_modal', (modal,), {}))
+
+class FakeBot:
+    def __init__(self, users=(), guilds=()):
+        self.users = list(users)
+        self.guilds = list(guilds)
+        self._ready = asyncio.Event()
+
+    def get_guild(self, guild_id:int):
+        return next((guild for guild in self.guilds if guild.id == guild_id), None)
+
+    async def wait_until_ready(self):
+        # The bench never connects, so background loops stay in their before_loop hook.
+        await self._ready.wait()
@@ -5,274 +5,318 @@ TODO: Clean up ConfigAboutme
 import os
 import sys
 import io
+import csv
+import gzip
+import json
+import time
+import asyncio
+import aiohttp
+import tempfile
+import itertools
 import discord
-import sqlite3
-import re
 import datetime
+import calendar
 import traceback
 import logging
-import json
 from collections import OrderedDict
 from discord.ext import commands, tasks
 from discord.commands import slash_command, Option, user_command
 from discord.ext.commands import MissingPermissions, NotOwner
 from pathlib import Path
+from utils.metrics import timed
+from utils.localization import catalog
+from utils.guildconfig import guild_configs
+from utils.checks import admin_guild_ids
+from utils.database import db
+from utils.cache import LRUCache, caches
+from utils.snapshot import snapshot
+from utils.settings import settings
+from utils.sharding import WorkerConfig
+from utils.outbound import outbound, BACKGROUND
+from utils.birthdays import parse_birthday, format_birthday, age_on
 
-locales = ('en-US', 'de')
-owners = [459747395027075095]
+infos = ('name', 'birthday', 'country', 'hobbies')
+profile_cache = LRUCache(maxsize=10000, ttl=600)
+# Upcoming birthdays with the age they turn, keyed by (guild, first day, days). Cleared when a birthday
+# or its visibility changes.
+birthday_cache = LRUCache(maxsize=1024, ttl=3600)
+# Guilds users were seen using Aboutme in, as `(guild_id, user_id)`. Only the first sighting per guild is
+# written to `aboutme_guilds`, which decides where a profile can be found by search.
+known_members = LRUCache(maxsize=100000, ttl=86400)
+caches.register('profile_cache', profile_cache)
+caches.register('birthday_cache', birthday_cache)
+caches.register('known_members', known_members)
+# Birthdays are announced once a day after this hour (UTC).
+announce_hour = 8
 
-logger = logging.getLogger()
+# Exports and imports move this many rows per database job and transaction. Files are buffered in memory
+# up to `spool_size` bytes and on disk beyond that.
+transfer_rows = 5000
+spool_size = 8 * 1024 * 1024
+export_columns = ('user_id', 'info', 'value', 'toggle')
 
-def is_authorized(**perms):
-    original = commands.has_permissions(**perms).predicate
-    async def extended_check(ctx):
-        if ctx.guild is None:
-            return False
-        return ctx.author.id in owners or await original(ctx)
-    return commands.check(extended_check)
+# Member options are resolved from the interaction payload, so no member cache is needed.
+bot_capabilities = {'intents': ('guilds',), 'member_cache': (), 'message_cache': 0}
 
-class Localization:
-    def __init__(self, locale):
-        """
-        The function initializes an object with a given locale, loads a JSON file corresponding to that
-        locale, and assigns localization values.
-        """
-        try:
-            super().__init__()
-            self.locale = locale
-            self.file_name = os.path.basename(__file__).split('.py')[0]
-            self.json_content = self.load_locale_file(locale)
-            self.assign_localization()
-        except:logger.error(traceback.format_exc())
-    
-    def load_locale_file(self, locale):
-        try:
-            if not os.path.exists(Path(sys.path[0], 'Localization', f'{locale}-locale.json')):
-                locale = 'en-US'
-            with open(Path(sys.path[0], 'Localization', f'{locale}-locale.json')) as f:
-                j = json.loads(f.read())
-            return j
-        except:logger.error(traceback.format_exc())
-        
-    def assign_localization(self):
-            try:
-                base_content = self.json_content[self.file_name]
-                for function, values in base_content.items():
-                    setattr(self, function, self._NestedClass(values))
-            except:logger.error(traceback.format_exc())
-
-    class _NestedClass:
-        def __init__(self, values):
-            try:
-                for k, v in values.items():
-                    setattr(self, k, v)
-            except:logger.error(traceback.format_exc())
+logger = logging.getLogger()
+
+Localization = catalog.bind(os.path.basename(__file__).split('.py')[0])
 
 # The `ConfigAboutme` class is a Discord UI view that allows users to add or remove fields from their
 # personal About Me information.
 class ConfigAboutme(discord.ui.View):  
-    def __init__(self, user_id:int):
+    placeholder_option = discord.SelectOption(label='Select an option', value='Placeholder')
+
+    def __init__(self, user_id:int, toggles:dict, locale:str = 'en-US'):
+        """
+        The function initializes the view with the user's field toggles. The view keeps them in memory
+        and changes its own select options on every click, so it is never rebuilt from the database.
+        """
         try:
             super().__init__(timeout=30)
             self.user_id = user_id
-            self.db_path = Path(sys.path[0], 'bot.db')
-            infos = ['name', 'birthday', 'country', 'hobbies']
-            with sqlite3.connect(self.db_path) as con:
-                c = con.cursor()
-                c.execute("CREATE TABLE IF NOT EXISTS aboutme (user_id INTEGER NOT NULL, info TEXT NOT NULL, value TEXT, toggle INTEGER DEFAULT 1 CHECK (toggle < 2), PRIMARY KEY (user_id, info))")
-                for info in infos:
-                    if not check_info(info, user_id):
-                        c.execute('INSERT INTO aboutme (user_id, info) VALUES (?,?)', (user_id, info,))
-                con.commit()
-                self.remops = [row[0] for row in c.execute('SELECT info FROM aboutme WHERE user_id = ? AND toggle = 1',(user_id,)).fetchall()]
-                self.addops = [row[0] for row in c.execute('SELECT info FROM aboutme WHERE user_id = ? AND toggle = 0',(user_id,)).fetchall()]
-                self.addselect.options = [discord.SelectOption(label=info, value=info) for info in self.addops] if self.addops else self.addselect.options
-                self.addselect.disabled = True if not self.addops else False
-                self.removeselect.options = [discord.SelectOption(label=info, value=info) for info in self.remops] if self.remops else self.removeselect.options
-                self.removeselect.disabled = True if not self.remops else False
-                self.addselect.placeholder = {locale: Localization(locale).addselect.placeholder for locale in locales}
+            self.toggles = dict(toggles)
+            self.lock = asyncio.Lock()
+            loc = Localization(locale)
+            self.addselect.placeholder = loc.addselect.placeholder
+            self.removeselect.placeholder = loc.removeselect.placeholder
+            self.refresh_options()
         except:logger.error(traceback.format_exc())
+
+    @classmethod
+    async def create(cls, user_id:int, locale:str = 'en-US'):
+        """
+        The function returns a new `ConfigAboutme` view for a user, reading the toggles from the cached
+        profile.
+        """
+        profile = await get_profile(user_id)
+        return cls(user_id, {info: toggle for info, (value, toggle) in profile.items()}, locale)
+
+    def refresh_options(self):
+        """
+        The function rebuilds the options of both selects from the in-memory toggles.
+        """
+        addops = [info for info in infos if self.toggles[info] == 0]
+        remops = [info for info in infos if self.toggles[info] == 1]
+        self.addselect.options = [discord.SelectOption(label=info, value=info) for info in addops] or [self.placeholder_option]
+        self.addselect.disabled = not addops
+        self.removeselect.options = [discord.SelectOption(label=info, value=info) for info in remops] or [self.placeholder_option]
+        self.removeselect.disabled = not remops
+
+    async def set_toggle(self, info:str, toggle:int, interaction:discord.Interaction):
+        """
+        The function changes one toggle with a single write and edits the message with the updated view.
+        Clicks are handled one at a time, so quick repeated clicks can't leave the view and the database
+        out of sync.
+        """
+        async with self.lock:
+            if self.toggles.get(info, toggle) != toggle:
+                await db.execute('INSERT INTO aboutme (user_id, info, toggle) VALUES (?,?,?) ON CONFLICT (user_id, info) DO UPDATE SET toggle = excluded.toggle', (self.user_id, info, toggle,))
+                profile_cache.invalidate(self.user_id)
+                if info == 'birthday':
+                    birthday_cache.clear()
+                self.toggles[info] = toggle
+                self.refresh_options()
+            await interaction.response.edit_message(view=self)
     
-    @discord.ui.select(placeholder='Add a field to your Aboutme', options=[discord.SelectOption(label='Select an option', value='Placeholder')], row=0)
+    @discord.ui.select(placeholder='Add a field to your Aboutme', options=[placeholder_option], row=0)
     #localization: placeholder
+    @timed('ConfigAboutme.addselect')
     async def addselect(self, select, interaction):
         """
-        The function `addselect` updates a database record, modifies a list of options, and edits a
-        message in response to a user interaction.
+        The function `addselect` makes the selected field visible again.
         """
         try:
-            select.disabled=False
-            selval = select.values[0]
-            with sqlite3.connect(Path(sys.path[0], 'bot.db')) as con:
-                c = con.cursor()
-                c.execute('UPDATE aboutme SET toggle = ? WHERE user_id = ? AND info = ?', (1, self.user_id, selval,))
-                con.commit()
-            self.addselect.options = [option for option in self.addselect.options if option.value != selval]
-            await interaction.response.edit_message(view=ConfigAboutme(self.user_id))
+            await self.set_toggle(select.values[0], 1, interaction)
         except:logger.error(traceback.format_exc())
 
-    @discord.ui.select(placeholder='Remove a field from your Aboutme', options=[discord.SelectOption(label='Select an option', value='Placeholder')], row=1)
+    @discord.ui.select(placeholder='Remove a field from your Aboutme', options=[placeholder_option], row=1)
     #localization: placeholder
+    @timed('ConfigAboutme.removeselect')
     async def removeselect(self, select, interaction):
         """
-        The function `removeselect` updates a database and removes an option from a select menu in a
-        Discord interaction.
+        The function `removeselect` hides the selected field from the user's Aboutme.
         """
         try:
-            select.disabled=False
-            selval = select.values[0]
-            with sqlite3.connect(Path(sys.path[0], 'bot.db')) as con:
-                c = con.cursor()
-                c.execute('UPDATE aboutme SET toggle = ? WHERE user_id = ? AND info = ?', (0, self.user_id, selval,))
-                con.commit()
-            self.removeselect.options = [option for option in self.removeselect.options if option.value != selval]
-            await interaction.response.edit_message(view=ConfigAboutme(self.user_id))
+            await self.set_toggle(select.values[0], 0, interaction)
         except:logger.error(traceback.format_exc())
     
 # The `AboutModal` class is a Discord UI modal that allows users to input and display information
 # about themselves.
 class AboutModal(discord.ui.Modal):
-    def __init__(self, user_id:int):
-        self.db_path = Path(sys.path[0], 'bot.db')
+    labels = {'birthday': 'birthday (dd.mm.yyyy)'}
+
+    def __init__(self, user_id:int, info_dict:OrderedDict):
+        """
+        The function initializes the modal with one input per visible field. The inputs are identified
+        by their field name as `custom_id`, so the labels can change without affecting what is stored.
+        """
         self.user_id = user_id
         super().__init__(title='About you:')
-        infos = ['name', 'birthday', 'country', 'hobbies']
-        info_dict = OrderedDict()
         try:
-            with sqlite3.connect(self.db_path) as con:
-                c = con.cursor()
-                c.execute("CREATE TABLE IF NOT EXISTS aboutme (user_id INTEGER NOT NULL, info TEXT NOT NULL, value TEXT, toggle INTEGER DEFAULT 1 CHECK (toggle < 2), PRIMARY KEY (user_id, info))")
-                for info in infos:
-                    if not check_info(info, user_id):
-                        c.execute('INSERT INTO aboutme (user_id, info) VALUES (?,?)', (self.user_id, info,))
-                con.commit()
-                rows = list(
-                    c.execute(
-                        'SELECT info, value FROM aboutme WHERE user_id = ? AND toggle = 1',
-                        (self.user_id,),
-                    ).fetchall()
-                )
-                for row in rows:
-                    info, value = row
-                    info_dict[info] = value
-                info_dict = OrderedDict((info, info_dict[info]) for info in infos if info in info_dict)
-            for info in info_dict.keys():
-                if info == 'birthday':
-                    label = info
-                    label += '(dd.mm.yyyy)'
-                    self.add_item(discord.ui.InputText(label=label, value=info_dict[info]))
-                    continue
-                self.add_item(discord.ui.InputText(label=info, value=info_dict[info]))
+            for info, value in info_dict.items():
+                self.add_item(discord.ui.InputText(label=self.labels.get(info, info), value=value, custom_id=info))
         except:logger.error(traceback.format_exc())
+
+    @classmethod
+    async def create(cls, user_id:int):
+        """
+        The function loads the user's visible fields from the database and returns a new `AboutModal`
+        prefilled with them.
+        """
+        return cls(user_id, visible_infos(await get_profile(user_id)))
             
     #localization: embed_author
+    @timed('AboutModal.submit')
     async def aboutmodal_callback(self, interaction):
         """
-        The `aboutmodal_callback` function updates the user's information in a database and sends an
-        embed message with the updated information.
+        The `aboutmodal_callback` function stores all submitted fields in a single transaction and sends
+        an embed message with the updated information.
         """
         try:
-            values = {}
-            for child in self.children:
-                if isinstance(child, discord.ui.InputText):
-                    if 'birthday' in child.label:
-                        child.label = child.label.replace('(dd.mm.yyyy)', '')
-                    values[child.label] = child.value
+            values = OrderedDict((child.custom_id, child.value) for child in self.children if isinstance(child, discord.ui.InputText) and child.custom_id in infos)
+            birthdate = None
+            if 'birthday' in values:
+                birthdate = parse_birthday(values['birthday'])
+                if birthdate is not None:
+                    values['birthday'] = format_birthday(birthdate)
+            await db.transaction(save_profile, self.user_id, values, birthdate)
+            profile_cache.invalidate(self.user_id)
+            if 'birthday' in values:
+                birthday_cache.clear()
             embed = discord.Embed()
             embed.set_author(name=f'About me of {interaction.user.display_name}', icon_url=interaction.user.avatar,)
-            with sqlite3.connect(self.db_path) as con:
-                c = con.cursor()
-                for value in values:
-                    c.execute('UPDATE aboutme SET value = ? WHERE info = ? AND user_id = ?', (values[value], value, self.user_id,))
-                    if value == 'birthday' and values[value] is not None:
-                        age = age_from_string(values[value])
-                        if age is not None:
-                            embed.add_field(name='age', value=age)
-                    embed.add_field(name=value, value=values[value])
-                con.commit()
+            for info, value in values.items():
+                if info == 'birthday' and birthdate is not None:
+                    embed.add_field(name='age', value=age_on(birthdate))
+                embed.add_field(name=info, value=value)
             await interaction.response.send_message(embed=embed, ephemeral=True, delete_after=10)
+            await remember_guild(self.user_id, interaction.guild_id)
         except:logger.error(traceback.format_exc())
 
-# The `Social` class is a Python class that defines commands and listeners for managing user profiles
-# and displaying information about users.
-class Social(commands.Cog):
-    def __init__(self, bot):
-        self.bot = bot
-        self.db_path = Path(sys.path[0], 'bot.db')
-        with sqlite3.connect(self.db_path) as con:
-            c = con.cursor()
-            c.execute("CREATE TABLE IF NOT EXISTS aboutme (user_id INTEGER NOT NULL, info TEXT NOT NULL, value TEXT, toggle INTEGER DEFAULT 1 CHECK (toggle < 2), PRIMARY KEY (user_id, info))")
-        
-    @commands.Cog.listener()
-    async def on_ready(self):
-        return
-        [setattr(option, 'description_localizations', {locale: Localization(locale).clear_msgs.amount_desc for locale in locales}) for option in self.clear_msgs.options if option.name == 'amount']
-        [setattr(option, 'name_localizations', {locale: Localization(locale).clear_msgs.amount_name for locale in locales}) for option in self.clear_msgs.options if option.name == 'amount']
+    # py-cord calls `callback` when the modal is submitted.
+    callback = aboutmodal_callback
 
-    @commands.Cog.listener()
-    async def on_ready(self):
+# The `SearchView` class pages through the results of `/aboutme search`. Pages are addressed by the
+# last index rowid before them, so every page is one range scan of the index no matter how deep it is.
+# The users of a page are checked against the guild, users who left it are removed from its index.
+class SearchView(discord.ui.View):
+    page_size = 10
+    # Rendering a page loads it again after users were removed, at most this many times.
+    max_reloads = 2
+
+    def __init__(self, guild:discord.Guild, query:str, match:str, locale:str = 'en-US'):
+        super().__init__(timeout=120)
+        self.guild = guild
+        self.query = query
+        self.match = match
+        self.loc = Localization(locale)
+        # The cursor every visited page starts after, the last one is the current page.
+        self.cursors = [0]
+        self.next_cursor = None
+
+    async def render(self) -> discord.Embed:
         """
-        The function initializes a SQLite database table called "aboutme" and inserts default values for
-        certain information fields for each user in the bot's user list.
+        The function loads the current page and returns its embed. "Next" is disabled once a page comes
+        back short.
         """
+        for _ in range(self.max_reloads + 1):
+            rows = await db.run(search_profiles, self.match, self.guild.id, self.cursors[-1], self.page_size)
+            user_ids = list(dict.fromkeys(user_id for rowid, user_id, info, snippet in rows))
+            members = await guild_members(self.guild, user_ids)
+            if len(members) == len(user_ids):
+                break
+        self.next_cursor = rows[-1][0] if len(rows) == self.page_size else None
+        lines = [self.loc.search.entry.format(f'<@{user_id}>', info, snippet) for rowid, user_id, info, snippet in rows if user_id in members]
+        self.previous_page.disabled = len(self.cursors) == 1
+        self.next_page.disabled = self.next_cursor is None
+        embed = discord.Embed(title=self.loc.search.title.format(self.query[:200]), description='\n'.join(lines)[:4000] or self.loc.search.none)
+        embed.set_footer(text=self.loc.search.page.format(len(self.cursors)))
+        return embed
+
+    @discord.ui.button(label='◀', style=discord.ButtonStyle.secondary)
+    @timed('SearchView.previous')
+    async def previous_page(self, button, interaction):
         try:
-            infos = ['name', 'birthday', 'country', 'hobbies']
-            with sqlite3.connect(self.db_path) as con:
-                c = con.cursor()
-                c.execute("CREATE TABLE IF NOT EXISTS aboutme (user_id INTEGER NOT NULL, info TEXT NOT NULL, value TEXT, toggle INTEGER DEFAULT 1 CHECK (toggle < 2), PRIMARY KEY (user_id, info))")
-                for user in self.bot.users:
-                    for info in infos:
-                        if not check_info(info, user.id):
-                            c.execute('INSERT INTO aboutme (user_id, info) VALUES (?,?)', (user.id, info,))
-                con.commit()
+            if len(self.cursors) > 1:
+                self.cursors.pop()
+            await interaction.response.edit_message(embed=await self.render(), view=self)
         except:logger.error(traceback.format_exc())
 
+    @discord.ui.button(label='▶', style=discord.ButtonStyle.secondary)
+    @timed('SearchView.next')
+    async def next_page(self, button, interaction):
+        try:
+            if self.next_cursor is not None:
+                self.cursors.append(self.next_cursor)
+            await interaction.response.edit_message(embed=await self.render(), view=self)
+        except:logger.error(traceback.format_exc())
+
+# The `Social` class is a Python class that defines commands and listeners for managing user profiles
+# and displaying information about users.
+class Social(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.announce_key = f'birthdays_announced{WorkerConfig.from_env().suffix}'
+        self.announce_birthdays.start()
+
+    def cog_unload(self):
+        self.announce_birthdays.cancel()
+        
     aboutme = discord.SlashCommandGroup('aboutme')
 
     @aboutme.command(name='configure', description= 'Choose what information you want to display.')
     #localization: command_name, command_desc
+    @timed('aboutme configure')
     async def aboutme_config(self, ctx):
         """
         The `aboutme_config` function is an asynchronous function that takes a `ctx` parameter and
         responds with a view called `ConfigAboutme` for the user specified by the `ctx.author.id`.
         """ 
         try:
-            await ctx.respond(view=ConfigAboutme(user_id=ctx.author.id), ephemeral=True, delete_after=30)
+            await ctx.respond(view=await ConfigAboutme.create(user_id=ctx.author.id, locale=guild_configs.locale_for(ctx)), ephemeral=True, delete_after=30)
+            await remember_guild(ctx.author.id, ctx.guild_id)
         except:logger.error(traceback.format_exc())
 
     @aboutme.command(name='write',description='Write some Information about yourself.')    
     #localization: command_name, command_desc
+    @timed('aboutme write')
     async def update_aboutme(self, ctx):
         """
         The function `update_aboutme` is an asynchronous function that takes a `ctx` parameter and sends
         a modal with the user's ID.
         """
         try:
-            await ctx.send_modal(AboutModal(ctx.author.id))
+            await ctx.send_modal(await AboutModal.create(ctx.author.id))
         except:logger.error(traceback.format_exc())
         
     @user_command(name='Aboutme', cog='social')
+    @timed('Aboutme (user command)')
     async def usercmd_about_user(self, ctx, user: discord.Member):
         """
         This function is used to display the "About Me" information of a user in a Discord embed.
         """
         try:
-            embed = create_aboutme_embed(user)
+            embed = await create_aboutme_embed(user)
             await ctx.respond(embed=embed, delete_after=30)
+            await remember_guild(user.id, ctx.guild_id)
         except:logger.error(traceback.format_exc())
 
     @aboutme.command(name='user', description='Show the Aboutme of another user.')
     #localization: command_desc, user_name, user_desc
+    @timed('aboutme user')
     async def about_user(self, ctx, user: Option(discord.Member, description='User whose Aboutme you want to see.')):
         """
         This function is used to display the "About Me" information of a user in a Discord embed.
         """
         try:
-            embed = create_aboutme_embed(user)
+            embed = await create_aboutme_embed(user)
             await ctx.respond(embed=embed, delete_after=30)
+            await remember_guild(user.id, ctx.guild_id)
         except:logger.error(traceback.format_exc())
         
     @aboutme.command(name='self', description='Show the About Me of yourself.')
+    @timed('aboutme self')
     async def about_self(self, ctx: discord.ApplicationContext):
         """
         The `about_self` function creates an embed with information about the author of a Discord message
@@ -280,10 +324,145 @@ class Social(commands.Cog):
         """
         try:
             user = ctx.author
-            embed = create_aboutme_embed(user)
+            embed = await create_aboutme_embed(user)
             await ctx.respond(embed=embed, delete_after=30)
+            await remember_guild(user.id, ctx.guild_id)
+        except:logger.error(traceback.format_exc())
+
+    @aboutme.command(name='birthdays', description='Shows the birthdays of this server.', guild_only=True)
+    #localization: title_today, title_week, none, entry
+    @timed('aboutme birthdays')
+    async def show_birthdays(self, ctx, period: Option(str, description='Today or the next 7 days.', choices=['today', 'week'], default='today')):
+        """
+        The function lists the members of this server whose birthday is today or within the next 7 days,
+        together with the age they turn.
+        """
+        try:
+            loc = Localization(guild_configs.locale_for(ctx))
+            await ctx.defer()
+            upcoming = await upcoming_birthdays(ctx.guild_id, datetime.date.today(), 1 if period == 'today' else 7)
+            members = await guild_members(ctx.guild, [user_id for user_id, occurs, age in upcoming])
+            lines = [loc.birthdays.entry.format(members[user_id].mention, age, occurs.strftime('%d.%m.')) for user_id, occurs, age in upcoming if user_id in members]
+            embed = discord.Embed(title=loc.birthdays.title_today if period == 'today' else loc.birthdays.title_week, description='\n'.join(lines)[:4000] or loc.birthdays.none)
+            await ctx.respond(embed=embed, delete_after=60)
+        except:logger.error(traceback.format_exc())
+
+    @aboutme.command(name='search', description='Finds members of this server by their Aboutme.', guild_only=True)
+    #localization: title, entry, none, page
+    @timed('aboutme search')
+    async def search(self, ctx, query: Option(str, description='Words to look for, e.g. a hobby or a country.', max_length=100)):
+        """
+        The function searches the visible Aboutme fields of the members that used Aboutme in this server
+        and shows the matches in pages of ten.
+        """
+        try:
+            locale = guild_configs.locale_for(ctx)
+            match = fts_query(query)
+            if match is None:
+                await ctx.respond(Localization(locale).search.none, ephemeral=True)
+                return
+            await ctx.defer(ephemeral=True)
+            await remember_guild(ctx.author.id, ctx.guild_id)
+            view = SearchView(ctx.guild, query, match, locale)
+            await ctx.respond(embed=await view.render(), view=view, ephemeral=True)
+        except:logger.error(traceback.format_exc())
+
+    @slash_command(name='aboutme_export', guild_ids=admin_guild_ids, guild_only=True)
+    @commands.is_owner()
+    @timed('aboutme_export')
+    async def export_aboutme(self, ctx, format: Option(str, description='File format of the export.', choices=['jsonl', 'csv'], default='jsonl')):
+        """
+        The function streams the `aboutme` table into a gzip-compressed JSONL or CSV file and sends it.
+        Rows are read and compressed chunk by chunk, so memory use doesn't grow with the table.
+        """
+        try:
+            await ctx.defer(ephemeral=True)
+            t = time.perf_counter()
+            count = 0
+            with tempfile.SpooledTemporaryFile(max_size=spool_size) as out:
+                with gzip.GzipFile(fileobj=out, mode='wb', compresslevel=6) as gz:
+                    if format == 'csv':
+                        gz.write(','.join(export_columns).encode() + b'\r\n')
+                    async for rows in export_chunks():
+                        await asyncio.to_thread(gz.write, ''.join(encode_rows(rows, format)).encode())
+                        count += len(rows)
+                elapsed = time.perf_counter() - t
+                size = out.tell()
+                if size > ctx.guild.filesize_limit:
+                    await ctx.respond(f'The export is {size / 1024 / 1024:.1f} MB, more than the {ctx.guild.filesize_limit / 1024 / 1024:.0f} MB upload limit of this server.', ephemeral=True)
+                    return
+                out.seek(0)
+                file = discord.File(fp=out, filename=f'aboutme-{datetime.date.today().isoformat()}.{format}.gz')
+                await ctx.respond(f'Exported {count} rows in {elapsed:.1f}s ({count / elapsed:.0f} rows/s), {size / 1024:.0f} KB compressed.', file=file, ephemeral=True)
+        except:logger.error(traceback.format_exc())
+
+    @slash_command(name='aboutme_import', guild_ids=admin_guild_ids, guild_only=True)
+    @commands.is_owner()
+    @timed('aboutme_import')
+    async def import_aboutme(self, ctx, file: Option(discord.Attachment, description='A .jsonl or .csv export, optionally gzip-compressed.')):
+        """
+        The function downloads an export and upserts its rows in transactions of `transfer_rows` rows.
+        Invalid rows are skipped. If the file is broken part way, the rows before it stay imported.
+        """
+        try:
+            await ctx.defer(ephemeral=True)
+            t = time.perf_counter()
+            imported = skipped = 0
+            error = None
+            with tempfile.SpooledTemporaryFile(max_size=spool_size) as upload:
+                await download(file.url, upload)
+                upload.seek(0)
+                records = read_records(upload, 'csv' if file.filename.lower().removesuffix('.gz').endswith('.csv') else 'jsonl')
+                try:
+                    while chunk := await asyncio.to_thread(list, itertools.islice(records, transfer_rows)):
+                        rows = [row for row in chunk if row is not None]
+                        skipped += len(chunk) - len(rows)
+                        await db.transaction(import_profiles, rows)
+                        imported += len(rows)
+                except (ValueError, OSError, EOFError, csv.Error) as e:
+                    error = e
+            profile_cache.clear()
+            birthday_cache.clear()
+            elapsed = time.perf_counter() - t
+            report = f'Imported {imported} rows in {elapsed:.1f}s ({imported / elapsed:.0f} rows/s), skipped {skipped} invalid rows.'
+            if error is not None:
+                report += f'\nStopped reading the file: {error}'
+            await ctx.respond(report, ephemeral=True)
+        except:logger.error(traceback.format_exc())
+
+    @tasks.loop(hours=1)
+    #localization: announcement
+    async def announce_birthdays(self):
+        """
+        The function posts today's birthdays in the status channel of every guild that configured one,
+        once a day. The day is stored, so a restart doesn't announce twice and a missed hour is caught up.
+        """
+        try:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            today = now.date()
+            if now.hour < announce_hour or settings.get(self.announce_key) == today.isoformat():
+                return
+            await settings.update_settings(today.isoformat(), self.announce_key)
+            for config in guild_configs.configs():
+                guild = self.bot.get_guild(config.guild_id)
+                if guild is None or not config.status_channel_id:
+                    continue
+                upcoming = await upcoming_birthdays(guild.id, today, 1)
+                if not upcoming:
+                    continue
+                members = await guild_members(guild, [user_id for user_id, occurs, age in upcoming])
+                mentions = [f'{members[user_id].mention} ({age})' for user_id, occurs, age in upcoming if user_id in members]
+                channel = guild.get_channel(config.status_channel_id)
+                if not mentions or channel is None:
+                    continue
+                text = Localization(config.locale or 'en-US').announce_birthdays.announcement.format(', '.join(mentions))
+                outbound.submit('message_send', lambda channel=channel, text=text: channel.send(text[:2000]), BACKGROUND, major=channel.id)
         except:logger.error(traceback.format_exc())
 
+    @announce_birthdays.before_loop
+    async def before_announce_birthdays(self):
+        await self.bot.wait_until_ready()
+
     async def cog_command_error(self, ctx, error):
         """
         The function `cog_command_error` handles specific errors that may occur during command execution
@@ -296,38 +475,18 @@ class Social(commands.Cog):
                 await ctx.respond("You are not my Owner.", ephemeral=True, delete_after=10)     
         except:logger.error(traceback.format_exc())   
 
-def create_aboutme_embed(user: discord.User):
+async def create_aboutme_embed(user: discord.User):
     """
     The function `create_aboutme_embed` creates an embed object containing information about a user's
     profile.
     """
     try:
-        infos = ['name', 'birthday', 'country', 'hobbies']
-        info_dict = OrderedDict()
         embed = discord.Embed()
-        age = ''
-        with sqlite3.connect(Path(sys.path[0], 'bot.db')) as con:
-            c = con.cursor()
-            c.execute("CREATE TABLE IF NOT EXISTS aboutme (user_id INTEGER NOT NULL, info TEXT NOT NULL, value TEXT, toggle INTEGER DEFAULT 1 CHECK (toggle < 2), PRIMARY KEY (user_id, info))")
-            for info in infos:
-                if not check_info(info, user.id):
-                    c.execute('INSERT INTO aboutme (user_id, info) VALUES (?,?)', (user.id, info,))
-            con.commit()
-            rows = list(
-                c.execute(
-                    'SELECT info, value FROM aboutme WHERE user_id = ? AND toggle = 1',
-                    (user.id,),
-                ).fetchall()
-            )
-            for row in rows:
-                info, value = row
-                info_dict[info] = value
-            info_dict = OrderedDict((info, info_dict[info]) for info in infos if info in info_dict)
+        profile = await get_profile(user.id)
+        info_dict = visible_infos(profile)
         for info in info_dict.keys():
-            if info == 'birthday' and info_dict[info] is not None:
-                age = age_from_string(info_dict[info])
-                if age is not None:
-                    embed.add_field(name='age', value=age)
+            if info == 'birthday' and profile.birthdate is not None:
+                embed.add_field(name='age', value=age_on(profile.birthdate))
             embed.add_field(name=info, value=info_dict[info])
         embed.set_author(
             name=f'About me of {user.display_name}', icon_url=user.avatar
@@ -337,38 +496,280 @@ def create_aboutme_embed(user: discord.User):
         return embed
     except:logger.error(traceback.format_exc())
 
-def check_info(info: str, user_id:int) -> bool:
+async def get_profile(user_id:int) -> 'Profile':
+    """
+    The function returns the resolved profile of a user, served from `profile_cache` when possible.
+    Every code path that writes to `aboutme` or `birthdays` invalidates the user's entry.
+    """
+    profile = profile_cache.get(user_id)
+    if profile is None:
+        generation = profile_cache.generation()
+        profile = await db.run(load_profile, user_id)
+        # Not stored if the profile was changed while it was loading.
+        profile_cache.set(user_id, profile, generation)
+    return profile
+
+# The `Profile` class is the `{info: (value, toggle)}` mapping of a user together with the parsed
+# birthday, so the age can be computed without parsing the stored text.
+class Profile(OrderedDict):
+    birthdate = None
+
+# The functions below run on the database worker thread and receive its connection.
+def load_profile(con, user_id:int) -> Profile:
+    """
+    The function returns `{info: (value, toggle)}` for every `aboutme` field of a user in display
+    order. Rows are only stored once a user edits something, so missing fields resolve to the
+    defaults (no value, visible) without writing anything.
+    """
+    stored = {info: (value, toggle) for info, value, toggle in con.execute('SELECT info, value, toggle FROM aboutme WHERE user_id = ?', (user_id,))}
+    profile = Profile((info, stored.get(info, (None, 1))) for info in infos)
+    row = con.execute('SELECT year, month, day FROM birthdays WHERE user_id = ?', (user_id,)).fetchone()
+    if row is not None:
+        profile.birthdate = datetime.date(*row)
+    return profile
+
+def save_profile(con, user_id:int, values:dict, birthdate:datetime.date = None):
+    """
+    The function upserts the submitted field values of a user in one batch. If a birthday was
+    submitted, its parsed date is stored alongside, or removed if it could not be parsed.
+    """
+    con.executemany('INSERT INTO aboutme (user_id, info, value) VALUES (?,?,?) ON CONFLICT (user_id, info) DO UPDATE SET value = excluded.value',
+                    [(user_id, info, value) for info, value in values.items()])
+    if birthdate is not None:
+        con.execute('INSERT INTO birthdays (user_id, year, month, day) VALUES (?,?,?,?) ON CONFLICT (user_id) DO UPDATE SET year = excluded.year, month = excluded.month, day = excluded.day',
+                    (user_id, birthdate.year, birthdate.month, birthdate.day))
+    elif 'birthday' in values:
+        con.execute('DELETE FROM birthdays WHERE user_id = ?', (user_id,))
+
+async def upcoming_birthdays(guild_id:int, start:datetime.date, days:int) -> list:
+    """
+    The function returns `(user_id, date, age)` for every visible birthday of a guild in the `days` days
+    from `start`, ordered by date. The list is computed once per guild, day and window.
+    """
+    key = (guild_id, start, days)
+    upcoming = birthday_cache.get(key)
+    if upcoming is None:
+        upcoming = []
+        generation = birthday_cache.generation()
+        for user_id, year, month_day in await db.run(load_birthdays, guild_id, start, days):
+            month, day = divmod(month_day, 100)
+            occurs_year = start.year if (month, day) >= (start.month, start.day) else start.year + 1
+            # Birthdays on the 29th of February are celebrated on the 28th in other years.
+            occurs = datetime.date(occurs_year, month, 28 if month == 2 and day == 29 and not calendar.isleap(occurs_year) else day)
+            upcoming.append((user_id, occurs, occurs.year - year))
+        upcoming.sort(key=lambda b: b[1])
+        birthday_cache.set(key, upcoming, generation)
+    return upcoming
+
+async def guild_members(guild:discord.Guild, user_ids:list) -> dict:
+    """
+    The function returns `{user_id: member}` for the users that are members of `guild`. Members are
+    requested by ID over the gateway, 100 at a time, so neither the members intent nor a member cache
+    is needed. Users that are not members anymore are removed from the guild's Aboutme users.
+    """
+    members = {}
+    for i in range(0, len(user_ids), 100):
+        for member in await guild.query_members(user_ids=user_ids[i:i + 100], limit=100, cache=False):
+            members[member.id] = member
+    await forget_guild([user_id for user_id in user_ids if user_id not in members], guild.id)
+    return members
+
+def load_birthdays(con, guild_id:int, start:datetime.date, days:int) -> list:
+    """
+    The function returns `(user_id, year, month_day)` of the visible birthdays of a guild's Aboutme users
+    between `start` and the following `days - 1` days, with one range scan of the month/day index per
+    year the window touches. The guild is part of the query, so the result doesn't grow with the other
+    guilds.
+    """
+    end = start + datetime.timedelta(days=days - 1)
+    first, last = start.month * 100 + start.day, end.month * 100 + end.day
+    if last == 228 and not calendar.isleap(end.year):
+        last = 229
+    ranges = [(first, last)] if first <= last else [(first, 1231), (101, last)]
+    rows = []
+    for low, high in ranges:
+        rows += con.execute('''SELECT b.user_id, b.year, b.month_day FROM birthdays AS b
+                               JOIN aboutme_guilds AS g ON g.user_id = b.user_id AND g.guild_id = ?
+                               LEFT JOIN aboutme AS a ON a.user_id = b.user_id AND a.info = 'birthday'
+                               WHERE b.month_day BETWEEN ? AND ? AND COALESCE(a.toggle, 1) = 1''', (guild_id, low, high)).fetchall()
+    return rows
+
+def fts_query(text:str) -> str:
+    """
+    The function turns user input into an FTS5 query that matches all of its words, the last one as a
+    prefix. Every word is quoted, so the input can't contain query syntax. Returns None for blank input.
+    """
+    words = ['"' + word.replace('"', '""') + '"' for word in text.split()]
+    return ' '.join(words) + '*' if words else None
+
+def search_profiles(con, match:str, guild_id:int, after:int, limit:int) -> list:
+    """
+    The function returns `(rowid, user_id, info, snippet)` of up to `limit` visible fields matching
+    `match` in `guild_id` whose index rowid is greater than `after`, in rowid order. The guild is part
+    of the full-text query, so rows of other guilds are never visited.
+    """
+    return con.execute('''SELECT rowid, user_id, info, snippet(aboutme_fts, 0, '**', '**', '…', 12) FROM aboutme_fts
+                          WHERE aboutme_fts MATCH ? AND rowid > ? ORDER BY rowid LIMIT ?''', (f'value : ({match}) AND guilds : g{int(guild_id)}', after, limit)).fetchall()
+
+async def remember_guild(user_id:int, guild_id:int):
+    """
+    The function records that a user used Aboutme in a guild, which makes their profile searchable there.
+    """
+    if guild_id is None or (guild_id, user_id) in known_members:
+        return
+    await db.execute('INSERT OR IGNORE INTO aboutme_guilds (user_id, guild_id) VALUES (?,?)', (user_id, guild_id))
+    known_members.set((guild_id, user_id), True)
+
+async def forget_guild(user_ids:list, guild_id:int):
+    """
+    The function removes users that left a guild from its Aboutme users, so their profiles can't be found
+    by search and their birthdays are not shown there anymore. Using Aboutme in the guild again adds them
+    back.
+    """
+    if not user_ids:
+        return
+    await db.executemany('DELETE FROM aboutme_guilds WHERE user_id = ? AND guild_id = ?', [(user_id, guild_id) for user_id in user_ids])
+    for user_id in user_ids:
+        known_members.invalidate((guild_id, user_id))
+    birthday_cache.clear()
+    logger.info(f'Removed {len(user_ids)} users that left guild {guild_id} from its Aboutme users')
+
+async def export_chunks():
+    """
+    The function yields the rows of `aboutme` in primary key order, `transfer_rows` at a time. Every
+    chunk is one range scan that continues after the last key of the previous one.
+    """
+    after = (-1, '')
+    while True:
+        rows = await db.run(export_chunk, after, transfer_rows)
+        if rows:
+            yield rows
+        if len(rows) < transfer_rows:
+            return
+        after = rows[-1][:2]
+
+def export_chunk(con, after:tuple, limit:int) -> list:
+    return con.execute('SELECT user_id, info, value, toggle FROM aboutme WHERE (user_id, info) > (?,?) ORDER BY user_id, info LIMIT ?', (*after, limit)).fetchall()
+
+def encode_rows(rows:list, format:str):
+    """
+    The function yields the lines of `rows` in the export format.
+    """
+    if format == 'csv':
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        yield buffer.getvalue()
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(export_columns, row)), ensure_ascii=False) + '\n'
+
+async def download(url:str, fp, chunk_size:int = 64 * 1024):
+    """
+    The function streams a file into `fp` without holding all of it in memory.
+    """
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as response:
+            response.raise_for_status()
+            async for data in response.content.iter_chunked(chunk_size):
+                fp.write(data)
+
+def read_records(fp, format:str):
     """
-    The function `check_info` checks if a given `info` exists in the `aboutme` table for a specific
-    `user_id` in a SQLite database.
+    The function yields `(user_id, info, value, toggle)` for every record of an export, or None for
+    records that are not valid. Gzip-compressed files are recognized by their magic number.
     """
+    compressed = fp.read(2) == b'\x1f\x8b'
+    fp.seek(0)
+    text = io.TextIOWrapper(gzip.GzipFile(fileobj=fp, mode='rb') if compressed else fp, encoding='utf-8', newline='')
+    if format == 'csv':
+        records = csv.DictReader(text)
+    else:
+        records = (parse_json_record(line) for line in text if line.strip())
+    for record in records:
+        yield profile_row(record)
+
+def parse_json_record(line:str):
     try:
-        with sqlite3.connect(Path(sys.path[0], 'bot.db')) as con:
-            c = con.cursor()
-            c.execute('SELECT * FROM aboutme WHERE info = ? AND user_id = ?', (info, user_id))
-            result = c.fetchone()
-            return result is not None and result[0] is not None
-    except:logger.error(traceback.format_exc())
+        return json.loads(line)
+    except ValueError:
+        return None
 
-def age_from_string(date_string):
+def profile_row(record) -> tuple:
     """
-    The function `age_from_string` takes a date string in the format "dd/mm/yyyy" and returns the age
-    based on the current date.
+    The function validates one imported record and returns it as an `aboutme` row, or None. Empty
+    values are stored as no value, since CSV can't tell them apart.
     """
+    if not isinstance(record, dict):
+        return None
     try:
-        pattern = r'^(0[1-9]|[12][0-9]|3[01])[./](0[1-9]|1[0-2])[./]\d{4}$'
-        if re.match(pattern, date_string):
-            day, month, year = map(int, re.split(r'[./]', date_string))
-            birthdate = datetime.datetime(year, month, day)
-            today = datetime.date.today()
-            return (
-                today.year
-                - birthdate.year
-                - ((today.month, today.day) < (birthdate.month, birthdate.day))
-            )
+        user_id = int(record['user_id'])
+        info = record['info']
+        value = record.get('value')
+        toggle = record.get('toggle')
+        toggle = 1 if toggle in (None, '') else int(toggle)
+    except (KeyError, TypeError, ValueError):
+        return None
+    if user_id <= 0 or info not in infos or toggle not in (0, 1) or not isinstance(value, (str, type(None))) or len(value or '') > 1024:
+        return None
+    return (user_id, info, value or None, toggle)
+
+def import_profiles(con, rows:list):
+    """
+    The function upserts a chunk of imported rows. Birthdays are normalized and stored in `birthdays`
+    like when they are submitted in the modal, unparsable ones are kept as text only.
+    """
+    birthdays, removed = [], []
+    for i, (user_id, info, value, toggle) in enumerate(rows):
+        if info != 'birthday':
+            continue
+        birthdate = parse_birthday(value)
+        if birthdate is None:
+            removed.append((user_id,))
         else:
-            return None
-    except:logger.error(traceback.format_exc())
+            rows[i] = (user_id, info, format_birthday(birthdate), toggle)
+            birthdays.append((user_id, birthdate.year, birthdate.month, birthdate.day))
+    con.executemany('INSERT INTO aboutme (user_id, info, value, toggle) VALUES (?,?,?,?) ON CONFLICT (user_id, info) DO UPDATE SET value = excluded.value, toggle = excluded.toggle', rows)
+    con.executemany('INSERT INTO birthdays (user_id, year, month, day) VALUES (?,?,?,?) ON CONFLICT (user_id) DO UPDATE SET year = excluded.year, month = excluded.month, day = excluded.day', birthdays)
+    con.executemany('DELETE FROM birthdays WHERE user_id = ?', removed)
+
+def visible_infos(profile:OrderedDict) -> OrderedDict:
+    """
+    The function reduces a profile returned by `load_profile` to the values of its visible fields.
+    """
+    return OrderedDict((info, value) for info, (value, toggle) in profile.items() if toggle == 1)
+
+def dump_profiles() -> list:
+    """
+    The function returns the cached profiles as plain tuples for the warm-restart snapshot, so loading
+    the snapshot doesn't need this module.
+    """
+    return [(user_id, remaining, (list(profile.items()), profile.birthdate)) for user_id, remaining, profile in profile_cache.dump()]
+
+def restore_profiles(entries:list):
+    profiles = []
+    for user_id, remaining, (items, birthdate) in entries:
+        profile = Profile(items)
+        profile.birthdate = birthdate
+        profiles.append((user_id, remaining, profile))
+    profile_cache.restore(profiles)
+
+async def verify_profiles():
+    """
+    The function reloads every cached profile in one database job and replaces the entries that
+    changed while the bot was restarting. Entries that were invalidated or replaced in the meantime
+    are left alone.
+    """
+    before = {user_id: profile_cache.get(user_id, count=False) for user_id in profile_cache.keys()}
+    fresh = await db.run(lambda con: {user_id: load_profile(con, user_id) for user_id in before})
+    changed = 0
+    for user_id, profile in fresh.items():
+        cached = profile_cache.get(user_id, count=False)
+        if cached is not None and cached is before[user_id] and (cached != profile or cached.birthdate != profile.birthdate):
+            profile_cache.set(user_id, profile)
+            changed += 1
+    logger.info(f'Checked {len(fresh)} restored profiles, {changed} changed')
+
+snapshot.register('profile_cache', dump_profiles, restore_profiles, verify_profiles)
 
 def setup(bot):
     bot.add_cog(Social(bot))
\ No newline at end of file
@@ -8,62 +8,33 @@ import io
 import discord
 import logging
 import traceback
-import json
 import asyncio
+import datetime
 from discord.ext import commands, tasks
 from discord.commands import slash_command, Option
 from discord.ext.commands import MissingPermissions, NotOwner
 from pathlib import Path
+from utils.metrics import timed
+from utils.localization import catalog
+from utils.guildconfig import guild_configs
+from utils.checks import locales, is_authorized
+from utils.outbound import outbound, USER
 
-locales = ('en-US', 'de')
-owners = [459747395027075095]
 
-logger = logging.getLogger()
+# Purges page through the channel history over the API, so neither message intents nor a message
+# cache are needed.
+bot_capabilities = {'intents': ('guilds',), 'member_cache': (), 'message_cache': 0}
 
-def is_authorized(**perms):
-    original = commands.has_permissions(**perms).predicate
-    async def extended_check(ctx):
-        if ctx.guild is None:
-            return False
-        return ctx.author.id in owners or await original(ctx)
-    return commands.check(extended_check)
+logger = logging.getLogger()
 
-class Localization:
-    def __init__(self, locale):
-        """
-        The function initializes an object with a given locale, loads a JSON file corresponding to that
-        locale, and assigns localization values.
-        """
-        try:
-            super().__init__()
-            self.locale = locale
-            self.file_name = os.path.basename(__file__).split('.py')[0]
-            self.json_content = self.load_locale_file(locale)
-            self.assign_localization()
-        except:logger.error(traceback.format_exc())
-    
-    def load_locale_file(self, locale):
-        try:
-            if not os.path.exists(Path(sys.path[0], 'Localization', f'{locale}-locale.json')):
-                locale = 'en-US'
-            with open(Path(sys.path[0], 'Localization', f'{locale}-locale.json')) as f:
-                j = json.loads(f.read())
-            return j
-        except:logger.error(traceback.format_exc())
-        
-    def assign_localization(self):
-            try:
-                base_content = self.json_content[self.file_name]
-                for function, values in base_content.items():
-                    setattr(self, function, self._NestedClass(values))
-            except:logger.error(traceback.format_exc())
+Localization = catalog.bind(os.path.basename(__file__).split('.py')[0])
 
-    class _NestedClass:
-        def __init__(self, values):
-            try:
-                for k, v in values.items():
-                    setattr(self, k, v)
-            except:logger.error(traceback.format_exc())
+def localized(function:str, key:str) -> dict:
+    """
+    The function returns `{locale: text}` of one key for every supported locale. Option localizations are
+    passed on the `Option` annotations, since py-cord parses the options again when the cog is added.
+    """
+    return {locale: getattr(getattr(Localization(locale), function), key) for locale in locales}
 
 class GeneralUtility(commands.Cog):
     def __init__(self, bot:discord.Bot):
@@ -75,15 +46,9 @@ class GeneralUtility(commands.Cog):
 
     utility = discord.SlashCommandGroup('utility')
 
-    @commands.Cog.listener()
-    async def on_ready(self):
-        [setattr(option, 'description_localizations', {locale: Localization(locale).clear_msgs.amount_desc for locale in locales}) for option in self.clear_msgs.options if option.name == 'amount']
-        [setattr(option, 'name_localizations', {locale: Localization(locale).clear_msgs.amount_name for locale in locales}) for option in self.clear_msgs.options if option.name == 'amount']
-        [setattr(option, 'description_localizations', {locale: Localization(locale).get_avatar.member_desc for locale in locales}) for option in self.get_avatar.options if option.name == 'user']
-        [setattr(option, 'name_localizations', {locale: Localization(locale).get_avatar.member_name for locale in locales}) for option in self.get_avatar.options if option.name == 'user']
-
     @utility.command(name='servericon', description='Fetches the servers Icon.', guild_only=True)
     #localization: command_desc
+    @timed('utility servericon')
     async def get_guildicon(self, ctx):
         try:
             await ctx.respond(ctx.guild.icon.url)
@@ -91,32 +56,88 @@ class GeneralUtility(commands.Cog):
 
     @utility.command(name='useravatar', description='Fetches a users avatar.')
     #localization: command_desc, member_name, member_desc
-    async def get_avatar(self, ctx, user: Option(discord.Member)):
+    @timed('utility useravatar')
+    async def get_avatar(self, ctx, user: Option(discord.Member, name_localizations=localized('get_avatar', 'member_name'), description_localizations=localized('get_avatar', 'member_desc'))):
         try:
             await ctx.respond(user.avatar.url)
         except:logger.error(traceback.format_exc())
 
     @utility.command(name='clear',description='Clears a specified amount of messages from the channel.', guild_only=True)
-    @commands.check(is_authorized(administrator=True))
-    #localization: command_desc, deleted_message, deleted_messages, amount_desc, amount_name
-    async def clear_msgs(self, ctx:discord.ApplicationContext, amount: Option(int, description='The maximum amount of messages to clear.')):
+    @is_authorized(administrator=True)
+    #localization: command_desc, deleted_message, deleted_messages, failed, progress, amount_desc, amount_name
+    @timed('utility clear')
+    async def clear_msgs(self, ctx:discord.ApplicationContext, amount: Option(int, description='The maximum amount of messages to clear.', name_localizations=localized('clear_msgs', 'amount_name'), description_localizations=localized('clear_msgs', 'amount_desc'))):
+        """
+        The function deletes up to `amount` messages in a single pass over the channel history. Messages
+        younger than 14 days are bulk deleted in batches of 100, older ones go through an individual
+        delete lane. Progress is shown on the deferred response for large purges. All requests go
+        through the outbound scheduler, so a purge never delays the reply to another command. Messages
+        that can't be deleted are skipped and counted in the reply.
+        """
         try:
-            loc = Localization(ctx.locale)
-            await ctx.defer()
-            msg_count = 0
+            loc = Localization(guild_configs.locale_for(ctx))
+            await ctx.defer(ephemeral=True)
+            # Bulk deletes fail for messages older than 14 days, the margin covers the time the purge takes.
+            bulk_cutoff = discord.utils.utcnow() - datetime.timedelta(days=14, minutes=-5)
+            deleted = failed = 0
+            last_progress = 0
+            batch = []
             async for msg in ctx.channel.history(limit=amount):
-                msg_count += 1
-                if msg_count == amount:
-                    break
-            if msg_count < amount:
-                amount = msg_count
-            await ctx.channel.purge(limit=amount)
-            if amount == 1:
-                await ctx.respond(loc.clear_msgs.deleted_message, ephemeral=True, delete_after=10)
-            else:
-                await ctx.respond(loc.clear_msgs.deleted_messages.format(amount), ephemeral=True, delete_after=10)
+                if msg.created_at > bulk_cutoff:
+                    batch.append(msg)
+                    if len(batch) == 100:
+                        done, errors = await self.bulk_delete(ctx.channel, batch)
+                        deleted, failed = deleted + done, failed + errors
+                        batch = []
+                else:
+                    done, errors = await self.single_delete(msg)
+                    deleted, failed = deleted + done, failed + errors
+                if amount > 100 and deleted - last_progress >= 100:
+                    last_progress = deleted
+                    # Not awaited, a progress edit that is still queued is replaced by the next one.
+                    content = loc.clear_msgs.progress.format(deleted, amount)
+                    outbound.submit('interaction_edit', lambda content=content: ctx.interaction.edit_original_response(content=content), USER, key=('clear', ctx.interaction.id))
+            if batch:
+                done, errors = await self.bulk_delete(ctx.channel, batch)
+                deleted, failed = deleted + done, failed + errors
+            content = loc.clear_msgs.deleted_message if deleted == 1 else loc.clear_msgs.deleted_messages.format(deleted)
+            if failed:
+                content += '\n' + loc.clear_msgs.failed.format(failed)
+            await outbound.submit('interaction_edit', lambda: ctx.interaction.edit_original_response(content=content, delete_after=10), USER, key=('clear', ctx.interaction.id))
         except:
             logger.error(traceback.format_exc())
+
+    async def bulk_delete(self, channel, messages:list) -> tuple:
+        """
+        The function deletes up to 100 messages younger than 14 days with one request and returns how
+        many were deleted and how many failed. If the bulk request fails it falls back to the individual
+        delete lane.
+        """
+        try:
+            await outbound.submit('bulk_delete', lambda: channel.delete_messages(messages), USER, major=channel.id)
+            return len(messages), 0
+        except discord.HTTPException:
+            logger.warning(traceback.format_exc())
+            deleted = failed = 0
+            for msg in messages:
+                done, errors = await self.single_delete(msg)
+                deleted, failed = deleted + done, failed + errors
+            return deleted, failed
+
+    async def single_delete(self, msg:discord.Message) -> tuple:
+        """
+        The function deletes a single message and returns `(1, 0)` if it was deleted and `(0, 1)` if the
+        request failed. The delete route is paced by the outbound scheduler, and messages that are already
+        gone are skipped.
+        """
+        try:
+            await outbound.submit('message_delete', lambda: msg.delete(), USER, major=msg.channel.id)
+            return 1, 0
+        except discord.NotFound:
+            return 0, 0
+        except discord.HTTPException as e:
+            logger.warning(f'Could not delete message {msg.id}: {e}')
+            return 0, 1
         
     #localization: MissingPermissions, NotOwner
     async def cog_command_error(self, ctx, error):
@@ -125,7 +146,7 @@ class GeneralUtility(commands.Cog):
         appropriate response based on the type of error.
         """
         try:
-            loc = Localization(ctx.locale)
+            loc = Localization(guild_configs.locale_for(ctx))
             if isinstance(error, MissingPermissions):
                 await ctx.respond(loc.cog_command_error.MissingPermissions, ephemeral=True)
             if isinstance(error, NotOwner):
@@ -8,73 +8,99 @@ import io
 import discord
 import logging
 import traceback
-import json
 from discord.ext import commands, tasks
 from discord.commands import slash_command, Option
 from discord.ext.commands import MissingPermissions, NotOwner
 from pathlib import Path
+from utils.metrics import timed
+from utils.localization import catalog
+from utils.guildconfig import guild_configs
+from utils.checks import locales, is_authorized, cog_name, core_cogs
 
-locales = ('en-US', 'de')
-owners = [459747395027075095]
 
-logger = logging.getLogger()
-
-def is_authorized(**perms):
-    original = commands.has_permissions(**perms).predicate
-    async def extended_check(ctx):
-        if ctx.guild is None:
-            return False
-        return ctx.author.id in owners or await original(ctx)
-    return commands.check(extended_check)
+bot_capabilities = {'intents': ('guilds',), 'member_cache': (), 'message_cache': 0}
+# This extension is loaded on first use, guppi.py finds it by these top-level command names.
+bot_commands = ('serversetup', 'serverconfig')
 
-# The above class is a localization class that loads a JSON file containing localization data and
-# assigns the data to class attributes.
-class Localization:
-    def __init__(self, locale):
-        """
-        The function initializes an object with a given locale, loads a JSON file corresponding to that
-        locale, and assigns localization values.
-        """
-        try:
-            super().__init__()
-            self.locale = locale
-            self.file_name = os.path.basename(__file__).split('.py')[0]
-            self.json_content = self.load_locale_file(locale)
-            self.assign_localization()
-        except:logger.error(traceback.format_exc())
-    
-    def load_locale_file(self, locale):
-        try:
-            if not os.path.exists(Path(sys.path[0], 'Localization', f'{locale}-locale.json')):
-                locale = 'en-US'
-            with open(Path(sys.path[0], 'Localization', f'{locale}-locale.json')) as f:
-                j = json.loads(f.read())
-            return j
-        except:logger.error(traceback.format_exc())
-        
-    def assign_localization(self):
-            try:
-                base_content = self.json_content[self.file_name]
-                for function, values in base_content.items():
-                    setattr(self, function, self._NestedClass(values))
-            except:logger.error(traceback.format_exc())
+logger = logging.getLogger()
 
-    class _NestedClass:
-        def __init__(self, values):
-            try:
-                for k, v in values.items():
-                    setattr(self, k, v)
-            except:logger.error(traceback.format_exc())
+Localization = catalog.bind(os.path.basename(__file__).split('.py')[0])
 
 class ServerSetup(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        loc = Localization('de')
+
+    serverconfig = discord.SlashCommandGroup('serverconfig', 'Configure the bot for this server.', guild_only=True)
 
     @slash_command(name='serversetup', description='Sends a server setup message')
     #localization: bot_info
+    @timed('serversetup')
     async def server_setup(self, ctx):
         pass
 
+    @serverconfig.command(name='show', description='Shows the configuration of this server.')
+    @is_authorized(administrator=True)
+    @timed('serverconfig show')
+    async def config_show(self, ctx):
+        try:
+            config = guild_configs.get(ctx.guild_id)
+            cogs = sorted(cog_name(cog) for cog in self.bot.cogs.values())
+            embed = discord.Embed(title=f'Configuration of {ctx.guild.name}')
+            embed.add_field(name='locale', value=config.locale or 'user locale')
+            embed.add_field(name='status channel', value=f'<#{config.status_channel_id}>' if config.status_channel_id else 'none')
+            embed.add_field(name='admin roles', value=', '.join(f'<@&{role}>' for role in sorted(config.admin_roles)) or 'none', inline=False)
+            embed.add_field(name='cogs', value=', '.join(f'{cog} ({"on" if config.cog_enabled(cog) else "off"})' for cog in cogs), inline=False)
+            await ctx.respond(embed=embed, ephemeral=True, delete_after=60)
+        except:logger.error(traceback.format_exc())
+
+    @serverconfig.command(name='locale', description='Sets the language the bot answers in on this server.')
+    @is_authorized(administrator=True)
+    @timed('serverconfig locale')
+    async def config_locale(self, ctx, locale: Option(str, description='Leave empty to use the language of each user.', choices=list(locales), default=None)):
+        try:
+            await guild_configs.update(ctx.guild_id, locale=locale)
+            await ctx.respond(f'Locale set to {locale or "the user locale"}.', ephemeral=True, delete_after=10)
+        except:logger.error(traceback.format_exc())
+
+    @serverconfig.command(name='statuschannel', description='Sets the channel the bot posts announcements in.')
+    @is_authorized(administrator=True)
+    @timed('serverconfig statuschannel')
+    async def config_statuschannel(self, ctx, channel: Option(discord.TextChannel, description='Leave empty to disable announcements.', default=None)):
+        try:
+            await guild_configs.update(ctx.guild_id, status_channel_id=channel.id if channel else None)
+            await ctx.respond(f'Status channel set to {channel.mention if channel else "none"}.', ephemeral=True, delete_after=10)
+        except:logger.error(traceback.format_exc())
+
+    @serverconfig.command(name='cog', description='Enables or disables a part of the bot on this server.')
+    @is_authorized(administrator=True)
+    @timed('serverconfig cog')
+    async def config_cog(self, ctx, cog: Option(str, description='Name of the cog.'), enabled: Option(bool, description='Whether the cog is enabled.')):
+        try:
+            if cog in core_cogs or cog not in {cog_name(c) for c in self.bot.cogs.values()}:
+                await ctx.respond(f"'{cog}' can't be changed.", ephemeral=True, delete_after=10)
+                return
+            disabled = guild_configs.get(ctx.guild_id).disabled_cogs
+            disabled = disabled - {cog} if enabled else disabled | {cog}
+            await guild_configs.update(ctx.guild_id, disabled_cogs=disabled)
+            await ctx.respond(f"'{cog}' is now {'enabled' if enabled else 'disabled'}.", ephemeral=True, delete_after=10)
+        except:logger.error(traceback.format_exc())
+
+    @serverconfig.command(name='adminrole', description='Allows or disallows a role to use the admin commands.')
+    @is_authorized(administrator=True)
+    @timed('serverconfig adminrole')
+    async def config_adminrole(self, ctx, role: Option(discord.Role, description='The role.'), allowed: Option(bool, description='Whether the role counts as admin.')):
+        try:
+            roles = guild_configs.get(ctx.guild_id).admin_roles
+            roles = roles | {role.id} if allowed else roles - {role.id}
+            await guild_configs.update(ctx.guild_id, admin_roles=roles)
+            await ctx.respond(f"{role.mention} {'is' if allowed else 'is no longer'} an admin role.", ephemeral=True, delete_after=10)
+        except:logger.error(traceback.format_exc())
+
+    async def cog_command_error(self, ctx, error):
+        try:
+            if isinstance(error, (MissingPermissions, commands.CheckFailure)):
+                await ctx.respond("You don't have permission to use this command.", ephemeral=True, delete_after=10)
+        except:logger.error(traceback.format_exc())
+
 def setup(bot):
     bot.add_cog(ServerSetup(bot))
\ No newline at end of file
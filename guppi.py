@@ -6,177 +6,103 @@ TODO: Add localization
 TODO: Create some sort of interface for customization for each server, web interface?
 """
 
+import time
+bot_starttime = time.perf_counter()
+from utils.startup import ImportProfiler
+import_profiler = ImportProfiler()
+import_profiler.start()
+
 import discord
 import os
-import time
+import io
 import asyncio
-import sqlite3
 import sys
 import datetime
+import collections
 import logging
 import traceback
 from pathlib import Path
 from discord.ext import commands, tasks
 from discord.ext.commands import MissingPermissions, NotOwner
+from utils.database import db
+from utils.migrations import migrate
+from utils.settings import settings
+from utils.startup import BootTimer, StartupTimes
+from utils.watcher import FileWatcher
+from utils.logs import setup_logging, stop_logging, read_tail
+from utils.metrics import metrics, timed
+from utils.intents import build_gateway_config, cache_report, read_literal
+from utils.guildconfig import guild_configs
+from utils.checks import admin_guild_ids, cog_enabled, CogDisabled
+from utils.outbound import outbound, INTERACTION, BACKGROUND
+from utils.sharding import WorkerConfig, record_shards, shard_summary, exit_stopped, exit_missing_settings, exit_killbot
+from utils.snapshot import snapshot
+from utils.cache import caches
+from utils.commandsync import sync_changed, refresh_command_ids
+from utils.localization import catalog
 
-# This section of code is responsible for setting up logging for the bot.
-logname = Path(sys.path[0], 'bot.log')
+# Set by launcher.py when the bot runs as several worker processes, unsharded otherwise.
+worker_config = WorkerConfig.from_env()
+# The code the process exits with once `bot.run` returns, killbot sets it so launcher.py doesn't restart
+# the worker.
+exit_code = exit_stopped
 
-logging.basicConfig(filename=logname,
-                    filemode='a',
-                    format='%(asctime)s.%(msecs)d %(name)s %(levelname)s %(message)s',
-                    datefmt='%H:%M:%S',
-                    level=logging.INFO)
+# This section of code is responsible for setting up logging for the bot.
+logname = Path(sys.path[0], f'bot{worker_config.suffix}.log')
+metrics_path = Path(sys.path[0], f'metrics{worker_config.suffix}.prom')
+snapshot_path = Path(sys.path[0], f'snapshot{worker_config.suffix}.bin')
 
-locales = ('en-US', 'de')
-owners = [459747395027075095]
+log_listener = setup_logging(logname)
 
 logger = logging.getLogger()
 
-def is_authorized(**perms):
-    original = commands.has_permissions(**perms).predicate
-    async def extended_check(ctx):
-        if ctx.guild is None:
-            return False
-        return ctx.author.id in owners or await original(ctx)
-    return commands.check(extended_check)
-
-intents = discord.Intents.all()
-bot = discord.Bot(intents=intents)
-
-# The `StartupTimes` class provides methods for initializing, retrieving, updating, and clearing
-# startup times stored in a SQLite database.
-class StartupTimes:
-    def __init__(self, db_path):
-        self.db_path = db_path
-        self.init_startup()
-
-    def init_startup(self):
-        """
-        The function initializes a SQLite database table for storing startup times if it doesn't already
-        exist.
-        """
-        with sqlite3.connect(self.db_path) as con:
-            c = con.cursor()
-            c.execute('''CREATE TABLE IF NOT EXISTS startup_times
-                        (startup_time REAL)''')
-            con.commit()
-
-    def retrieve_startup_times(self):
-        """
-        The function retrieves the startup times from a SQLite database.
-        :return: a list of startup times retrieved from the "startup_times" table in the SQLite
-        database.
-        """
-        with sqlite3.connect(self.db_path) as con:
-            c = con.cursor()
-            c.execute('SELECT startup_time FROM startup_times')
-            return [row[0] for row in c.fetchall()]
-        
-    def update_startup_times(self, new_time):
-        """
-        The function updates the startup times in a SQLite database with a new time value.
-        """
-        with sqlite3.connect(self.db_path) as con:
-            c = con.cursor()
-            c.execute('INSERT INTO startup_times (startup_time) VALUES (?)', (new_time,))
-            con.commit()
-
-    def clear_startup_times(self):
-        """
-        The function clears all the startup times stored in a SQLite database.
-        """
-        with sqlite3.connect(self.db_path) as con:
-            c = con.cursor()
-            c.execute('DELETE FROM startup_times')
-            con.commit()
-
-# The `Settings` class is a Python class that manages settings stored in a SQLite database.
-class Settings:
-    def __init__(self):
-        """
-        The function initializes the class instance with the necessary attributes.
-        """
-        self.db_path = Path(sys.path[0], 'bot.db')
-        self.init_settings()
-        self.bottoken = self.retrieve_setting(setting='bottoken')
-        self.statuschannel_id = self.retrieve_setting(setting='statuschannel_id')
-        self.bot_status = self.retrieve_setting(setting='bot_status')
-
-    def init_settings(self):
-        """
-        The function initializes settings in a SQLite database, prompts the user for input if the
-        settings are missing or invalid, and updates the settings accordingly.
-        """
-        with sqlite3.connect(self.db_path) as con:
-            c = con.cursor()
-            settings = ['bottoken', 'statuschannel_id', 'bot_status']
-            setup_vars = ['bottoken', 'statuschannel_id', 'bot_status']
-            default_settings = ['Invalid', 'Invalid', 'Custom Bot status']
-            c.execute('CREATE TABLE IF NOT EXISTS settings(setting TEXT, value TEXT)')
-            con.commit()
-            for s in settings:
-                if not self.check_setting(s):
-                    c.execute('INSERT INTO settings (setting) VALUES (?)', (s,))
-                    con.commit()
-        for i, s in enumerate(setup_vars):
-            while True:
-                if not self.check_setting(s) or self.retrieve_setting(s) is None:
-                    val = input(f'{s}:')
-                    if val == '':
-                        if default_settings[i] == 'Invalid':
-                            continue
-                        val = default_settings[i]
-                    self.update_settings(val, s)
-                    print(f'Added {s}: {val}\n')
-                break     
-    
-    def check_setting(self, setting: str) -> bool:
-        """
-        The function checks if a given setting exists in a SQLite database table and returns a boolean
-        value indicating its presence.
-        """
-        with sqlite3.connect(self.db_path) as con:
-            c = con.cursor()
-            c.execute('SELECT * FROM settings WHERE setting =?', (setting,))
-            result = c.fetchone()
-            return result is not None and result[0] is not None
-
-    def retrieve_setting(self, setting: str) -> str:
-        """
-        The function retrieves the value of a specific setting from a SQLite database.
-        """
-        with sqlite3.connect(self.db_path) as con:
-            c = con.cursor()
-            c.execute('SELECT value FROM settings WHERE setting =?', (setting,))
-            return c.fetchone()[0]
-    
-    def update_settings(self, value: str, setting: str):
-        """
-        The function updates a setting in a SQLite database with a given value.
-        """
-        with sqlite3.connect(self.db_path) as con:
-            c = con.cursor()
-            if not self.check_setting(setting):
-                c.execute('INSERT INTO settings (setting, value) VALUES (?, ?)', (setting, value))
-            else:
-                c.execute('UPDATE settings SET value = ? WHERE setting = ?', (value, setting))
-            con.commit()
+boot_timer = BootTimer(bot_starttime)
+
+bot_extensions = ('cogs.generalutility', 'cogs.aboutme', 'cogs.setup')
+# Rarely used extensions are only loaded when one of their commands is used for the first time. They
+# list their top-level command names in a `bot_commands` literal.
+lazy_extensions = ('cogs.setup',)
+# guppi.py itself needs the guild cache for the status channel and nothing else.
+bot_capabilities = {'intents': ('guilds',), 'member_cache': (), 'message_cache': 0}
+
+db.run_sync(migrate)
+# After a restart the caches of the previous process are restored instead of starting cold, they are
+# checked against the database once the bot is ready.
+with boot_timer.measure('snapshot'):
+    snapshot.load(snapshot_path)
+    if not snapshot.register('settings', settings.snapshot, settings.restore, settings.refresh):
+        settings.load()
+    snapshot.register('guild_configs', guild_configs.snapshot, guild_configs.restore)
+    snapshot.register('localization', catalog.snapshot, catalog.restore)
+gateway_profile = settings.get('gateway_profile', 'minimal')
+gateway_config = build_gateway_config(bot_extensions, bot_capabilities, gateway_profile)
+if worker_config.sharded:
+    bot = discord.AutoShardedBot(shard_ids=worker_config.shard_ids, shard_count=worker_config.shard_count, **gateway_config)
+else:
+    bot = discord.Bot(**gateway_config)
+bot.add_check(cog_enabled)
+Localization = catalog.bind('guppi')
+lazy_commands = {name: extension for extension in lazy_extensions for name in read_literal(extension, 'bot_commands', ())}
+metrics.collectors.append(outbound.prometheus)
+metrics.collectors.append(caches.prometheus)
 
 # The `MyView` class is a Discord UI view that contains two buttons, one for killing the bot and one
 # for restarting it, both of which require the owner's permission.
 class MyView(discord.ui.View):
     @discord.ui.button(label="Killbot", style=discord.ButtonStyle.danger)
     @commands.is_owner()
+    @timed('MyView.killbot')
     async def button_callbackkillbot(self, button, interaction):
         try:
             await interaction.response.defer()
             logger.info("Bot Closed")
+            global exit_code
+            exit_code = exit_killbot
             await bot.close()
-            sys.exit(1)
         except:logger.error(traceback.format_exc())
     @discord.ui.button(label="Restart", style=discord.ButtonStyle.danger)
     @commands.is_owner()
+    @timed('MyView.restart')
     async def button_callbackrestart(self, button: discord.Button, interaction: discord.Interaction):
         try:
             await interaction.response.defer()
@@ -185,56 +111,133 @@ class MyView(discord.ui.View):
         except:logger.error(traceback.format_exc())
     @discord.ui.button(label="Sync Commands", row=1)
     @commands.is_owner()
+    @timed('MyView.sync')
     async def button_callbacksync(self, button: discord.Button, interaction: discord.Interaction):
         try:
-            await interaction.response.send_message('Syncing Commands', ephemeral=True, delete_after=10)
+            await interaction.response.send_message('Syncing Commands', ephemeral=True, delete_after=30)
             logger.info('Syncing Commands')
-            await bot.sync_commands()
+            load_lazy_extensions()
+            await interaction.edit_original_response(content=await sync_changed(bot))
         except:logger.error(traceback.format_exc())
 
+async def get_status_channel():
+    """
+    The function returns the configured status channel, from the cache if possible.
+    """
+    return bot.get_channel(int(settings.statuschannel_id)) or await bot.fetch_channel(settings.statuschannel_id)
+
+async def cleanup_status_msgs():
+    """
+    The function runs once at startup. It looks at the most recent messages in the status channel,
+    keeps the tracked status message and bulk deletes any other message the bot left there.
+    """
+    try:
+        chan = await get_status_channel()
+        msg_id = settings.get('status_msg_id')
+        self_msgs = [message async for message in chan.history(limit=100) if message.author == bot.user]
+        if msg_id is None and self_msgs:
+            msg_id = str(self_msgs[0].id)
+            await settings.update_settings(msg_id, 'status_msg_id')
+        stale = [message for message in self_msgs if str(message.id) != msg_id]
+        if stale:
+            try:
+                await chan.delete_messages(stale)
+            except discord.HTTPException:
+                for message in stale:
+                    await message.delete()
+    except:logger.error(traceback.format_exc())
+
 @tasks.loop(seconds=5)
+@timed('loop status_msg')
 async def status_msg():
     """
     The `status_msg` function updates the performance information of a bot in a Discord channel and
-    calculates the average load time.
-    """
-    settings = Settings()
-    chan = bot.get_channel(settings.statuschannel_id) or await bot.fetch_channel(settings.statuschannel_id)
-    del settings
-    messages = await chan.history(limit=None).flatten()
-    self_msgs = [message for message in messages if message.author == bot.user]
-    if len(self_msgs) > 1:
-        for message in self_msgs:
-            await message.delete()
-    self_msgs = [message for message in messages if message.author == bot.user]
-    if len(self_msgs) == 1:
-        msg = self_msgs[0]
+    calculates the average load time. The message is updated through the outbound scheduler, so it
+    never delays a command reply.
+    """
+    chan = await get_status_channel()
     text = f'Bot was ready in: {load_time}s\nAvg. time until ready: {avg_load_time}s'
     embed=discord.Embed(colour=0x2ecc71)
     embed.add_field(name='Performance Information:', value=text)
+    embed.add_field(name='Startup phases (p50/p95/max):', value=phase_text, inline=False)
+    if worker_config.sharded:
+        rows = await db.query('SELECT shard_id, worker, guilds, latency, updated_at FROM shard_status ORDER BY shard_id')
+        embed.add_field(name='Shards:', value=shard_summary(rows, worker_config.shard_count), inline=False)
     embed.set_footer(text=f'Uptime: {str(datetime.timedelta(seconds=int(time.perf_counter() - bot_starttime)))}')
-    self_msgs = [message for message in messages if message.author == bot.user]
-    if len(self_msgs) == 0:
-        msg = await chan.send(embed=embed,view=MyView())
-    try:
-        await msg.edit(embed=embed,view=MyView())
-    except:
-        msg = await chan.send(embed=embed,view=MyView())
+    # The edit is queued without waiting, so ticks that happen while it is held back replace it.
+    outbound.submit('message_edit', lambda: update_status_msg(chan, embed), BACKGROUND, key='status_msg', major=chan.id)
+
+async def update_status_msg(chan, embed):
+    """
+    The function edits the status message by its stored ID and only sends it again if that edit fails.
+    """
+    msg_id = settings.get('status_msg_id')
+    if msg_id is not None:
+        try:
+            await chan.get_partial_message(int(msg_id)).edit(embed=embed,view=MyView())
+            return
+        except discord.HTTPException:
+            pass
+    msg = await chan.send(embed=embed,view=MyView())
+    await settings.update_settings(str(msg.id), 'status_msg_id')
 
-@tasks.loop(seconds=10)
+def read_version() -> str:
+    """
+    The function reads the `#Version:` header of this file.
+    """
+    with open(Path(sys.path[0],os.path.basename(__file__)), 'r') as f:
+        lines = f.readlines(1)
+        return lines[0].strip('#Version: \n')
+
+def create_file_watcher() -> FileWatcher:
+    """
+    The function creates a watcher over the core files (this file and `utils`) and the source files of
+    all loaded extensions.
+    """
+    global extension_paths
+    extension_paths = {Path(sys.path[0], *extension.split('.')).with_suffix('.py'): extension for extension in bot_extensions}
+    core_paths = [Path(sys.path[0],os.path.basename(__file__))] + sorted(Path(sys.path[0], 'utils').glob('*.py'))
+    return FileWatcher(core_paths + list(extension_paths))
+
+@tasks.loop(seconds=2)
+@timed('loop version_control')
 async def version_control():
     """
-    The function `version_control` checks the version of the current file and restarts the program if a
-    new version is detected.
+    The function `version_control` polls the source files for changes. A changed cog is reloaded on its
+    own through `bot.reload_extension`, a changed core file restarts the program.
     """
     try:
-        with open(Path(sys.path[0],os.path.basename(__file__)), 'r') as f:
-            lines = f.readlines(1)
-            file_version = lines[0].strip('#Version: \n')
-        if file_version and current_version != file_version:
+        changed = file_watcher.poll()
+        if any(path not in extension_paths for path in changed):
+            file_version = read_version()
             os.system('cls') if sys.platform == 'win32' else os.system('clear')
             print(f'Updated {bot.user.name}:\nbefore: {current_version}\nafter: {file_version}\n')
+            logger.info(f'Core files changed: {", ".join(path.name for path in changed)}, restarting')
+            save_snapshot()
+            stop_logging(log_listener)
             os.execv(sys.executable, ['python'] + sys.argv)
+        for path in changed:
+            extension = extension_paths[path]
+            # Lazy extensions that were not used yet are imported fresh on first use anyway.
+            if extension not in bot.extensions:
+                continue
+            t = time.perf_counter()
+            try:
+                bot.reload_extension(extension)
+                logger.info(f'Reloaded {extension} in {(time.perf_counter() - t) * 1000:.1f}ms')
+                # The reloaded commands are new objects without the IDs of the old ones.
+                await refresh_command_ids(bot)
+            except:logger.error(traceback.format_exc())
+    except:logger.error(traceback.format_exc())
+
+def save_snapshot():
+    """
+    The function writes the warm caches to the snapshot file right before the process execs itself.
+    """
+    try:
+        t = time.perf_counter()
+        size = snapshot.save()
+        logger.info(f'Wrote a snapshot of {size} bytes in {(time.perf_counter() - t) * 1000:.1f}ms')
     except:logger.error(traceback.format_exc())
 
 async def restart():
@@ -243,50 +246,138 @@ async def restart():
     Python script again.
     """
     try:
-        await bot.change_presence(activity=discord.Game('Restarting'), status=discord.Status.idle)
+        await outbound.submit('presence', lambda: bot.change_presence(activity=discord.Game('Restarting'), status=discord.Status.idle), INTERACTION, key='presence')
+        save_snapshot()
+        stop_logging(log_listener)
         os.execv(sys.executable, ['python'] + sys.argv)
     except:logger.error(traceback.format_exc())
 
-@bot.slash_command(guild_ids=[1109530644578582590], guild_only=True)
+@bot.slash_command(guild_ids=admin_guild_ids, guild_only=True)
 @commands.is_owner()
+@timed('set_status')
 async def set_status(ctx, status:discord.Option(str)):
-    Settings().update_settings(setting='bot_status', value=status)
+    await settings.update_settings(setting='bot_status', value=status)
     await ctx.respond(f"The bot's status has been updated to: \'{status}\'", delete_after=15, ephemeral=True)
-    await bot.change_presence(
-        activity=discord.Activity(
-            type=discord.ActivityType.custom,
-            name="Custom Status",
-            state=status,
-        )
-    )
 
-@bot.slash_command(guild_ids=[1109530644578582590], guild_only=True)
+async def apply_bot_status(status: str):
+    """
+    The function sets the bot's custom status. It is subscribed to changes of the `bot_status` setting.
+    The change is queued without waiting, since `set_status` still has to answer its interaction.
+    """
+    activity = discord.Activity(type=discord.ActivityType.custom, name="Custom Status", state=status)
+    outbound.submit('presence', lambda: bot.change_presence(activity=activity), BACKGROUND, key='presence')
+
+@bot.slash_command(guild_ids=admin_guild_ids, guild_only=True)
 @commands.is_owner()
-async def show_log(ctx):
-    log = discord.File(fp=Path(sys.path[0], 'bot.log'))
+@timed('show_log')
+async def show_log(ctx,
+                   kilobytes:discord.Option(int, description='How many KB from the end of the log to send.', default=64, min_value=1, max_value=8192),
+                   minutes:discord.Option(int, description='Only send records from the last x minutes.', default=None, min_value=1)):
+    """
+    The function sends the end of the current log file, limited to `kilobytes` and optionally to the
+    records of the last `minutes`. The file is read backwards from its end in a thread.
+    """
+    since = datetime.datetime.now() - datetime.timedelta(minutes=minutes) if minutes else None
+    data = await asyncio.to_thread(read_tail, logname, kilobytes * 1024, since)
+    log = discord.File(fp=io.BytesIO(data), filename='bot.log')
     await ctx.respond(file=log, ephemeral=True, delete_after=120)
 
-@bot.slash_command(guild_ids=[1109530644578582590], guild_only=True)
+@bot.slash_command(guild_ids=admin_guild_ids, guild_only=True)
 @commands.is_owner()
+@timed('clear_log')
 async def clear_log(ctx):
-    with open (Path(sys.path[0], 'bot.log'), 'r+') as f:
+    with open (logname, 'r+') as f:
         f.seek(0)
         f.truncate(0)
     await ctx.respond('Cleared the Log', ephemeral=True, delete_after=10)
 
-@bot.slash_command(guild_ids=[1109530644578582590], guild_only=True)
+@bot.slash_command(name='metrics', guild_ids=admin_guild_ids, guild_only=True)
+@commands.is_owner()
+async def show_metrics(ctx):
+    """
+    The function sends the latency, error and database statistics of all instrumented handlers, the
+    state of the outbound scheduler and the cache statistics.
+    """
+    text = f'{metrics.summary()}\n\n{outbound.summary()}\n\n{caches.summary()}'
+    await ctx.respond(f'```\n{text[-1900:]}\n```', ephemeral=True, delete_after=120)
+
+@bot.slash_command(name='memory', guild_ids=admin_guild_ids, guild_only=True)
 @commands.is_owner()
+@timed('memory')
+async def show_memory(ctx, profile:discord.Option(str, description='Gateway profile to use after the next restart.', choices=['minimal', 'all'], default=None)):
+    """
+    The function reports the process RSS and the cache entry counts of the active gateway profile.
+    Passing a profile stores it for the next restart, so the numbers of both can be compared.
+    """
+    text = cache_report(bot, gateway_profile)
+    if profile is not None and profile != settings.get('gateway_profile', 'minimal'):
+        await settings.update_settings(profile, 'gateway_profile')
+        text += f'\n\nProfile \'{profile}\' will be used after the next restart.'
+    await ctx.respond(f'```\n{text}\n```', ephemeral=True, delete_after=120)
+
+@bot.slash_command(name='sync', guild_ids=admin_guild_ids, guild_only=True)
+@commands.is_owner()
+@timed('sync')
+async def sync(ctx, force:discord.Option(bool, description='Sync the whole command tree even if nothing changed.', default=False)):
+    """
+    The function syncs the application commands whose hash changed and reports what was sent.
+    """
+    await ctx.defer(ephemeral=True)
+    load_lazy_extensions()
+    await ctx.respond(await sync_changed(bot, force), ephemeral=True, delete_after=60)
+
+@bot.slash_command(name='startup', guild_ids=admin_guild_ids, guild_only=True)
+@commands.is_owner()
+@timed('startup')
+async def show_startup(ctx):
+    """
+    The function sends the boot phases of this process and the modules that took the longest to
+    import.
+    """
+    lines = [f'{phase[:35]:<36}{seconds:>7.3f}s' for phase, seconds in boot_timer.phases.items()]
+    lines += ['', f'{"module":<32}{"own ms":>8}{"total ms":>9}']
+    lines += [f'{name[:31]:<32}{own * 1000:>8.1f}{total * 1000:>9.1f}' for name, total, own in import_profiler.top(15)]
+    text = '\n'.join(lines)
+    await ctx.respond(f'```\n{text[:1900]}\n```', ephemeral=True, delete_after=120)
+
+@tasks.loop(seconds=5)
+async def report_shards():
+    """
+    The function stores the guild count and latency of this worker's shards for the status message of
+    the primary worker, and picks up settings that another worker changed.
+    """
+    try:
+        guilds = collections.Counter(guild.shard_id for guild in bot.guilds)
+        shards = [(shard_id, guilds[shard_id], shard.latency) for shard_id, shard in bot.shards.items()]
+        await db.transaction(record_shards, worker_config.worker, shards)
+        await settings.refresh()
+    except:logger.error(traceback.format_exc())
+
+@tasks.loop(seconds=15)
+async def write_metrics():
+    """
+    The function writes the metrics to `metrics.prom` in the Prometheus text format, so they can be
+    scraped locally.
+    """
+    try:
+        await asyncio.to_thread(metrics.write_prometheus, metrics_path)
+    except:logger.error(traceback.format_exc())
+
+@bot.slash_command(guild_ids=admin_guild_ids, guild_only=True)
+@commands.is_owner()
+@timed('killbot')
 async def killbot(ctx):
     try:
         await ctx.defer()
         logger.info("Bot Closed")
+        global exit_code
+        exit_code = exit_killbot
         await bot.close()
-        sys.exit(1)
     except:logger.error(traceback.format_exc())
 
 @bot.event
 async def on_connect():
-    pass
+    boot_timer.record('connect', time.perf_counter() - connect_starttime)
 
 @bot.event
 #localization: MissingPermissions, NotOwner
@@ -302,6 +393,66 @@ async def on_command_error(ctx, error):
             await ctx.respond('You do not have the necessary Permission(s).', ephemeral=True, delete_after=10)
     except:logger.error(traceback.format_exc())
 
+@bot.listen('on_application_command_error')
+#localization: CogDisabled
+async def on_application_command_error(ctx, error):
+    """
+    The function answers commands of cogs the guild has disabled, which would otherwise fail without a
+    response.
+    """
+    try:
+        if isinstance(error, CogDisabled):
+            text = Localization(guild_configs.locale_for(ctx)).on_application_command_error.CogDisabled
+            await outbound.submit('interaction', lambda: ctx.respond(text, ephemeral=True, delete_after=10), INTERACTION)
+    except:logger.error(traceback.format_exc())
+
+def load_lazy_extensions():
+    """
+    The function loads every lazy extension that is not loaded yet, e.g. before the commands are
+    synced, so their commands aren't removed.
+    """
+    for extension in lazy_extensions:
+        if extension not in bot.extensions:
+            t = time.perf_counter()
+            bot.load_extension(extension)
+            logger.info(f'Loaded {extension} in {(time.perf_counter() - t) * 1000:.1f}ms')
+
+@bot.event
+async def on_unknown_application_command(interaction):
+    """
+    The function handles interactions for commands that are not known by their ID yet: it loads a lazy
+    extension when one of its commands is used for the first time, and maps any loaded command whose
+    ID was not fetched yet, e.g. right after a boot or a reload. Then it handles the interaction again.
+    """
+    try:
+        name = interaction.data.get('name')
+        extension = lazy_commands.get(name)
+        if extension is not None and extension not in bot.extensions:
+            t = time.perf_counter()
+            bot.load_extension(extension)
+            logger.info(f'Loaded {extension} on first use of /{name} in {(time.perf_counter() - t) * 1000:.1f}ms')
+        command_type = interaction.data.get('type', 1)
+        command = next((command for command in bot.pending_application_commands if command.name == name and command.to_dict().get('type', 1) == command_type), None)
+        if command is None or interaction.data['id'] in bot._application_commands:
+            return
+        # The command is registered on Discord already, it only has to be known by its ID.
+        command.id = interaction.data['id']
+        bot._application_commands[command.id] = command
+        await bot.process_application_commands(interaction)
+    except:logger.error(traceback.format_exc())
+
+@bot.listen('on_interaction')
+async def track_interaction(interaction):
+    outbound.interaction_received(interaction)
+
+@bot.event
+async def on_guild_join(guild):
+    await guild_configs.load_guild(guild.id)
+
+@bot.event
+async def on_guild_remove(guild):
+    guild_configs.forget(guild.id)
+
 @bot.event
 async def on_ready():
     """
@@ -309,57 +460,88 @@ async def on_ready():
     well as displaying the current version and setting a custom status.
     """
     try:
-        set = Settings()
-        global current_version
-        with open(Path(sys.path[0],os.path.basename(__file__)), 'r') as f:
-            l1 = f.readlines(1)
-            current_version = l1[0].strip('#Version: \n')
+        global current_version, file_watcher
+        current_version = read_version()
+        file_watcher = create_file_watcher()
         print(f'Version: {current_version}, Logged on as {bot.user}')
         logger.info(f'Version: {current_version}, Logged on as {bot.user}')  
+        await guild_configs.load(guild.id for guild in bot.guilds)
+        # With auto-sync off, interactions only find their command once its ID is known.
+        logger.info(f'Mapped the IDs of {await refresh_command_ids(bot)} commands')
+        global verify_task
+        verify_task = asyncio.create_task(snapshot.verify())
         version_control.start()  
-        await bot.change_presence(
-            activity=discord.Activity(
-                type=discord.ActivityType.custom,
-                name="Custom Status",
-                state=set.bot_status,
-            )
-        )
-        await bot_ready()
-        status_msg.start()
+        await apply_bot_status(settings.bot_status)
+        if worker_config.sharded and not report_shards.is_running():
+            report_shards.start()
+        if worker_config.primary:
+            await bot_ready()
+            await cleanup_status_msgs()
+            status_msg.start()
+        write_metrics.start()
     except:logger.error(traceback.format_exc())
 
 async def bot_ready():
-    global load_time, avg_load_time
-    startup = StartupTimes(Path(sys.path[0], "bot.db"))
-    bot_readytime = time.perf_counter()
-    load_time = round(bot_readytime - bot_starttime, 2)
-    load_times = startup.retrieve_startup_times()
-    load_times.append(load_time)
-    if len(load_times) > 20:
-        while len(load_times) > 20:
-            load_times.pop(0)
-    startup.clear_startup_times()
-    [startup.update_startup_times(lt) for lt in load_times]
+    """
+    The function records the timings of this boot in the startup ring buffer and prepares the
+    startup summary shown in the status message.
+    """
+    global load_time, avg_load_time, phase_text
+    if 'total' in boot_timer.phases:
+        return
+    startup = StartupTimes(db)
+    boot_timer.record('ready', time.perf_counter() - connect_starttime - boot_timer.phases.get('connect', 0))
+    boot_timer.record('total', boot_timer.elapsed())
+    load_time = round(boot_timer.phases['total'], 2)
+    await startup.record_boot(boot_timer.phases)
+    load_times = await startup.retrieve_startup_times('total')
     avg_load_time = round(sum(load_times)/len(load_times),2)
+    phase_text = '\n'.join(
+        f"{phase}: {stats['p50']:.2f}s / {stats['p95']:.2f}s / {stats['max']:.2f}s"
+        for phase, stats in (await startup.phase_stats()).items()
+    )
     
 def run():
     """
     The function runs a bot by loading extensions and running it with the bot token.
     """
+    logger.info(f"-----{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))}-----")
+    boot_timer.record('import', boot_timer.elapsed())
+    # Without a terminal, and in workers started by launcher.py, nobody can answer a prompt, so a
+    # missing setting ends the boot right away.
+    if worker_config.sharded or '--headless' in sys.argv or not (sys.stdin and sys.stdin.isatty()):
+        missing = settings.missing()
+        if missing:
+            logger.critical(f'Missing required settings: {", ".join(missing)}')
+            print(f'Missing required settings: {", ".join(missing)}, run the bot once in a terminal to set them.')
+            stop_logging(log_listener)
+            sys.exit(exit_missing_settings)
+    else:
+        settings.init_settings()
     try:
-        with open(Path(sys.path[0], 'bot.log'), 'a', encoding='utf-8') as f:
-            f.write(f"\n\n-----{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))}-----\n")
-        settings = Settings()
+        settings.subscribe('bot_status', apply_bot_status)
         for extension in bot_extensions: 
-            try:    
-                bot.load_extension(extension)
-            except:logger.error(traceback.format_exc())
+            if extension in lazy_extensions:
+                continue
+            imports = import_profiler.top_level
+            with boot_timer.measure(f'load {extension}'):
+                try:    
+                    bot.load_extension(extension)
+                except:logger.error(traceback.format_exc())
+            boot_timer.record(f'imports {extension}', import_profiler.top_level - imports)
+        import_profiler.stop()
+        logger.info('Slowest imports: ' + ', '.join(f'{name} {own * 1000:.0f}ms' for name, total, own in import_profiler.top(5)))
+        global connect_starttime
+        connect_starttime = time.perf_counter()
         bot.run(settings.bottoken)
-    except:logger.error(traceback.format_exc())
-
-global bot_starttime, bot_extensions
-bot_starttime = time.perf_counter()
-bot_extensions = ('cogs.generalutility', 'cogs.aboutme', 'cogs.setup')
+    except discord.LoginFailure:
+        # A wrong token is fixed in the settings, restarting would not help.
+        logger.critical(traceback.format_exc())
+        sys.exit(exit_missing_settings)
+    except:
+        logger.error(traceback.format_exc())
+        sys.exit(1)
+    sys.exit(exit_code)
 
 #Declare all necessary Variables before this
 run()
\ No newline at end of file
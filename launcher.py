@@ -0,0 +1,91 @@
+"""
+Runs guppi as several worker processes, each connecting a range of shards. Workers are started one
+after another so identifies stay within the connection concurrency limit, and a crashed worker is
+started again. When a worker is stopped on purpose (killbot, a missing setting or a clean shutdown), all
+workers are stopped.
+
+Usage:
+    python launcher.py --shards 4 --workers 2
+"""
+
+import os
+import sys
+import time
+import signal
+import logging
+import argparse
+import subprocess
+from pathlib import Path
+from utils.database import db
+from utils.migrations import migrate
+from utils.settings import settings
+from utils.sharding import WorkerConfig, assign_shards, stop_exit_codes
+from utils.logs import setup_logging, stop_logging
+
+logger = logging.getLogger()
+
+# Discord allows `max_concurrency` identifies per 5 seconds.
+identify_interval = 5.0
+restart_delay = 5.0
+
+def start_worker(config: WorkerConfig) -> subprocess.Popen:
+    env = dict(os.environ, **config.to_env())
+    process = subprocess.Popen([sys.executable, str(Path(sys.path[0], 'guppi.py'))], env=env, stdin=subprocess.DEVNULL)
+    logger.info(f'Started worker {config.worker} (pid {process.pid}) with shards {config.shard_ids}')
+    return process
+
+def stop_workers(processes: dict):
+    for process in processes.values():
+        if process.poll() is None:
+            process.terminate()
+    for process in processes.values():
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def run(args):
+    # Settings are prompted for here, the workers don't read stdin.
+    db.run_sync(migrate)
+    settings.load()
+    settings.init_settings()
+    db.close()
+
+    configs = [WorkerConfig(worker, shard_ids, args.shards) for worker, shard_ids in enumerate(assign_shards(args.shards, args.workers))]
+    processes = {}
+    for config in configs:
+        processes[config.worker] = start_worker(config)
+        # The next worker identifies only after this one's shards had their turn.
+        if config is not configs[-1]:
+            time.sleep(-(-len(config.shard_ids) // args.concurrency) * identify_interval)
+    try:
+        while True:
+            time.sleep(1)
+            for config in configs:
+                code = processes[config.worker].poll()
+                if code is None:
+                    continue
+                if code in stop_exit_codes:
+                    logger.info(f'Worker {config.worker} stopped with {code}, stopping all workers')
+                    stop_workers(processes)
+                    return
+                logger.warning(f'Worker {config.worker} exited with {code}, restarting')
+                time.sleep(restart_delay)
+                processes[config.worker] = start_worker(config)
+    except (KeyboardInterrupt, SystemExit):
+        stop_workers(processes)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--shards', default=None, type=int, help='total number of shards, one per worker by default')
+    parser.add_argument('--workers', default=1, type=int, help='number of worker processes')
+    parser.add_argument('--concurrency', default=1, type=int, help='max_concurrency of the bot, from GET /gateway/bot')
+    args = parser.parse_args()
+    args.shards = args.shards or args.workers
+    args.workers = max(1, min(args.workers, args.shards))
+    listener = setup_logging(Path(sys.path[0], 'launcher.log'))
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        run(args)
+    finally:
+        stop_logging(listener)
@@ -1,2 +1,2 @@
 cd /home/mcserver/guppi
-python3 *.py &
\ No newline at end of file
+python3 launcher.py &
\ No newline at end of file
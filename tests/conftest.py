@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# The bot resolves bot.db and the Localization folder relative to sys.path[0], so the repository root
+# has to come first.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,42 @@
+import asyncio
+import pytest
+
+pytest.importorskip('discord')
+
+import cogs.aboutme as aboutme
+
+def test_get_profile_drops_load_invalidated_while_pending(monkeypatch):
+    """
+    A profile that is written while `get_profile` waits for the database must not be cached in its old
+    state.
+    """
+    async def run():
+        loaded = asyncio.Event()
+        async def slow_run(func, *args):
+            await loaded.wait()
+            return aboutme.Profile((info, ('old', 1)) for info in aboutme.infos)
+        monkeypatch.setattr(aboutme.db, 'run', slow_run)
+        aboutme.profile_cache.clear()
+        pending = asyncio.create_task(aboutme.get_profile(1))
+        await asyncio.sleep(0)
+        aboutme.profile_cache.invalidate(1)
+        loaded.set()
+        profile = await pending
+        return profile
+    profile = asyncio.run(run())
+    assert profile['name'] == ('old', 1)
+    assert aboutme.profile_cache.get(1, count=False) is None
+
+def test_load_birthdays_only_returns_the_guild():
+    """
+    Birthdays of users that never used Aboutme in the guild must not be returned for it.
+    """
+    import sqlite3
+    import datetime
+    from utils.migrations import migrate
+    con = sqlite3.connect(':memory:')
+    migrate(con)
+    con.execute('INSERT INTO aboutme_guilds (user_id, guild_id) VALUES (1, 5), (2, 6)')
+    con.execute('INSERT INTO birthdays (user_id, year, month, day) VALUES (1, 1990, 3, 4), (2, 1991, 3, 4)')
+    rows = aboutme.load_birthdays(con, 5, datetime.date(2024, 3, 1), 7)
+    assert [row[0] for row in rows] == [1]
@@ -0,0 +1,71 @@
+import asyncio
+from utils.cache import LRUCache, CacheRegistry
+
+async def load_into(cache: LRUCache, key, value, loaded: asyncio.Event):
+    """
+    The function loads a value the way the cogs do: the generation is taken before the slow load and
+    passed to `set` afterwards.
+    """
+    generation = cache.generation()
+    await loaded.wait()
+    cache.set(key, value, generation)
+
+def test_invalidation_during_load_is_not_overwritten():
+    async def run():
+        cache = LRUCache(maxsize=10, ttl=60)
+        loaded = asyncio.Event()
+        load = asyncio.create_task(load_into(cache, 1, 'stale', loaded))
+        await asyncio.sleep(0)
+        cache.invalidate(1)
+        loaded.set()
+        await load
+        return cache
+    cache = asyncio.run(run())
+    assert cache.get(1) is None
+
+def test_clear_during_load_is_not_overwritten():
+    async def run():
+        cache = LRUCache(maxsize=10, ttl=60)
+        loaded = asyncio.Event()
+        load = asyncio.create_task(load_into(cache, 1, 'stale', loaded))
+        await asyncio.sleep(0)
+        cache.clear()
+        loaded.set()
+        await load
+        return cache
+    assert asyncio.run(run()).get(1) is None
+
+def test_load_after_invalidation_is_stored():
+    cache = LRUCache(maxsize=10, ttl=60)
+    cache.invalidate(1)
+    generation = cache.generation()
+    assert cache.set(1, 'fresh', generation)
+    assert cache.get(1) == 'fresh'
+
+def test_invalidating_other_keys_keeps_load():
+    cache = LRUCache(maxsize=10, ttl=60)
+    generation = cache.generation()
+    cache.invalidate(2)
+    assert cache.set(1, 'fresh', generation)
+
+def test_forgotten_invalidations_make_older_loads_stale():
+    cache = LRUCache(maxsize=2, ttl=60)
+    generation = cache.generation()
+    cache.invalidate(1)
+    for key in range(2, 5):
+        cache.invalidate(key)
+    assert len(cache._invalidated) == 2
+    assert not cache.set(1, 'stale', generation)
+    assert cache.set(1, 'fresh', cache.generation())
+
+def test_registry_renders_registered_caches():
+    registry = CacheRegistry()
+    cache = LRUCache(maxsize=10, ttl=60)
+    registry.register('profiles', cache)
+    cache.set(1, 'value')
+    cache.get(1)
+    cache.get(2)
+    assert 'profiles: 1/10, hit rate 50%' in registry.summary()
+    text = registry.prometheus()
+    assert 'guppi_cache_hits_total{cache="profiles"} 1' in text
+    assert 'guppi_cache_misses_total{cache="profiles"} 1' in text
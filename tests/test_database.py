@@ -0,0 +1,64 @@
+import time
+import asyncio
+import threading
+from utils.database import Database
+
+# The event loop must keep waking up on time while the worker thread is busy. The lag is around 5ms,
+# the bound leaves room for slow machines, while running the same load on the loop takes whole seconds.
+max_loop_lag = 0.1
+
+async def probe_lag(load) -> float:
+    """
+    The function awaits `load` while probing how late the event loop wakes up from 1ms sleeps, and
+    returns the worst lag in seconds.
+    """
+    lag = 0.0
+    done = False
+    async def probe():
+        nonlocal lag
+        while not done:
+            t = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lag = max(lag, time.perf_counter() - t - 0.001)
+    task = asyncio.create_task(probe())
+    try:
+        await load
+    finally:
+        done = True
+        await task
+    return lag
+
+def test_loop_not_blocked_under_load(tmp_path):
+    db = Database(tmp_path / 'test.db')
+    async def run():
+        await db.execute('CREATE TABLE t (a INTEGER, b TEXT)')
+        load = asyncio.gather(
+            *(db.executemany('INSERT INTO t (a, b) VALUES (?,?)', ((i, 'x' * 32) for i in range(20000))) for _ in range(20)),
+            *(db.query('SELECT COUNT(*), SUM(a) FROM t') for _ in range(100)),
+            *(db.transaction(lambda con: con.execute('UPDATE t SET b = ? WHERE a % 7 = 0', ('y',))) for _ in range(10)),
+        )
+        lag = await probe_lag(load)
+        count = await db.query_one('SELECT COUNT(*) FROM t')
+        return lag, count[0]
+    try:
+        lag, count = asyncio.run(run())
+    finally:
+        db.close()
+    assert count == 20 * 20000
+    assert lag < max_loop_lag, f'event loop was blocked for {lag * 1000:.1f}ms'
+
+def test_executemany_consumes_generator_on_worker(tmp_path):
+    db = Database(tmp_path / 'test.db')
+    threads = set()
+    def rows():
+        for i in range(10):
+            threads.add(threading.current_thread().name)
+            yield (i,)
+    async def run():
+        await db.execute('CREATE TABLE t (a INTEGER)')
+        return await db.executemany('INSERT INTO t (a) VALUES (?)', rows())
+    try:
+        assert asyncio.run(run()) == 10
+    finally:
+        db.close()
+    assert threads == {'guppi-db'}
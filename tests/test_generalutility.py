@@ -0,0 +1,21 @@
+import pytest
+
+discord = pytest.importorskip('discord')
+
+from cogs.generalutility import GeneralUtility, localized
+
+def test_option_localizations_survive_add_cog():
+    """
+    py-cord parses the options again when a cog is added, the localizations have to be part of the
+    payload that is hashed and synced.
+    """
+    bot = discord.Bot()
+    bot.add_cog(GeneralUtility(bot))
+    utility = next(command for command in bot.pending_application_commands if command.name == 'utility').to_dict()
+    subcommands = {option['name']: option for option in utility['options']}
+    amount = next(option for option in subcommands['clear']['options'] if option['name'] == 'amount')
+    assert amount['name_localizations'] == localized('clear_msgs', 'amount_name')
+    assert amount['description_localizations'] == localized('clear_msgs', 'amount_desc')
+    user = next(option for option in subcommands['useravatar']['options'] if option['name'] == 'user')
+    assert user['name_localizations'] == localized('get_avatar', 'member_name')
+    assert user['description_localizations'] == localized('get_avatar', 'member_desc')
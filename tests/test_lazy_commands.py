@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+from unittest import mock
+import pytest
+
+discord = pytest.importorskip('discord')
+
+from utils.intents import build_gateway_config
+from utils.commandsync import assign_ids, command_index
+
+def test_first_lazy_invocation_does_not_sync():
+    """
+    The first use of a command of a lazy extension reaches the bot before the extension is loaded. It
+    must be handed to `on_unknown_application_command` without py-cord syncing the command tree.
+    """
+    async def run():
+        bot = discord.Bot(**build_gateway_config(('cogs.setup',), {'intents': ('guilds',)}))
+        bot.sync_commands = mock.AsyncMock()
+        bot.http.bulk_upsert_global_commands = mock.AsyncMock()
+        bot.http.bulk_upsert_guild_commands = mock.AsyncMock()
+        dispatched = []
+        bot.dispatch = lambda event, *args: dispatched.append(event)
+        interaction = SimpleNamespace(
+            type=discord.InteractionType.application_command,
+            data={'id': '1', 'name': 'serverconfig', 'guild_id': '2', 'type': 1},
+        )
+        await bot.process_application_commands(interaction)
+        return bot, dispatched
+
+    bot, dispatched = asyncio.run(run())
+    assert dispatched == ['unknown_application_command']
+    bot.sync_commands.assert_not_awaited()
+    bot.http.bulk_upsert_global_commands.assert_not_awaited()
+    bot.http.bulk_upsert_guild_commands.assert_not_awaited()
+
+def test_global_command_in_guild_is_invoked():
+    """
+    With auto-sync off, a global command is only found by the ID fetched from Discord. py-cord's lookup
+    by name doesn't match global commands for interactions in a guild.
+    """
+    async def run():
+        bot = discord.Bot(**build_gateway_config((), {'intents': ('guilds',)}))
+        @bot.slash_command(name='ping', description='Ping.')
+        async def ping(ctx):
+            pass
+        assign_ids(bot, command_index(bot), {(0, 'ping', 1): '10'})
+        bot.invoke_application_command = mock.AsyncMock()
+        bot.sync_commands = mock.AsyncMock()
+        interaction = SimpleNamespace(
+            type=discord.InteractionType.application_command,
+            data={'id': '10', 'name': 'ping', 'guild_id': '2', 'type': 1},
+            _state=None,
+        )
+        await bot.process_application_commands(interaction)
+        return bot
+    bot = asyncio.run(run())
+    bot.sync_commands.assert_not_awaited()
+    bot.invoke_application_command.assert_awaited_once()
+    ctx = bot.invoke_application_command.await_args.args[0]
+    assert ctx.command.name == 'ping'
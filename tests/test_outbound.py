@@ -0,0 +1,23 @@
+import asyncio
+
+from utils import metrics
+from utils.outbound import OutboundScheduler, INTERACTION
+
+def test_jobs_do_not_inherit_the_first_submitters_context():
+    """
+    Requests are sent by the worker task, which must not carry the invocation of whoever submitted first.
+    """
+    async def run():
+        scheduler = OutboundScheduler()
+        seen = []
+        async def request():
+            seen.append(metrics._current.get())
+        token = metrics._current.set('first invocation')
+        try:
+            first = scheduler.submit('interaction', request, INTERACTION)
+        finally:
+            metrics._current.reset(token)
+        await first
+        await scheduler.submit('interaction', request, INTERACTION)
+        return seen
+    assert asyncio.run(run()) == [None, None]
@@ -0,0 +1,36 @@
+"""
+Birthday parsing. A birthday is parsed once when it is written and stored as numbers in the `birthdays`
+table, so reading a profile never parses the text again.
+"""
+
+import re
+import datetime
+
+birthday_pattern = re.compile(r'^(0[1-9]|[12][0-9]|3[01])[./](0[1-9]|1[0-2])[./](\d{4})$')
+
+def parse_birthday(text: str):
+    """
+    The function parses a birthday in the format "dd.mm.yyyy" or "dd/mm/yyyy" and returns a
+    `datetime.date`, or None if the text is not a valid date.
+    """
+    match = birthday_pattern.match(text.strip()) if text else None
+    if match is None:
+        return None
+    day, month, year = map(int, match.groups())
+    try:
+        return datetime.date(year, month, day)
+    except ValueError:
+        return None
+
+def format_birthday(birthdate: datetime.date) -> str:
+    """
+    The function returns the normalized text that is stored and shown for a birthday.
+    """
+    return f'{birthdate.day:02d}.{birthdate.month:02d}.{birthdate.year}'
+
+def age_on(birthdate: datetime.date, today: datetime.date = None) -> int:
+    """
+    The function returns the age of someone born on `birthdate` on the day `today`.
+    """
+    today = today or datetime.date.today()
+    return today.year - birthdate.year - ((today.month, today.day) < (birthdate.month, birthdate.day))
@@ -0,0 +1,166 @@
+"""
+Small in-memory caches shared by the cogs.
+"""
+
+import time
+from collections import OrderedDict
+
+_missing = object()
+
+# The `LRUCache` class is a size-limited mapping whose entries also expire after `ttl` seconds. It
+# counts hits, misses and evictions so its effectiveness can be checked at runtime.
+class LRUCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        """
+        The function initializes an empty cache holding at most `maxsize` entries for `ttl` seconds
+        each.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Every invalidation gets the next generation. Values loaded before a newer invalidation of
+        # their key, or before `_floor`, are not stored.
+        self._generation = 0
+        self._invalidated = OrderedDict()
+        self._floor = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _missing, count=False) is not _missing
+
+    def get(self, key, default=None, count: bool = True):
+        """
+        The function returns the cached value for `key`, or `default` if it is missing or expired.
+        """
+        entry = self._data.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > time.monotonic():
+                self._data.move_to_end(key)
+                if count:
+                    self.hits += 1
+                return value
+            del self._data[key]
+        if count:
+            self.misses += 1
+        return default
+
+    def generation(self) -> int:
+        """
+        The function returns the current generation. A caller that loads a value after this call passes
+        it to `set`, so the value is dropped if its key was invalidated while it was loading.
+        """
+        return self._generation
+
+    def set(self, key, value, generation: int = None) -> bool:
+        """
+        The function stores `value` under `key`, evicting the least recently used entry if the cache
+        is full. Returns False without storing if `generation` is older than the last invalidation of
+        `key`.
+        """
+        if generation is not None and (generation < self._floor or generation < self._invalidated.get(key, 0)):
+            return False
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+        return True
+
+    def invalidate(self, key):
+        """
+        The function removes `key` from the cache if it is present and makes pending loads of it stale.
+        Only the last `maxsize` invalidations are remembered, forgetting one makes every load that
+        started before it stale instead.
+        """
+        self._data.pop(key, None)
+        self._generation += 1
+        self._invalidated[key] = self._generation
+        self._invalidated.move_to_end(key)
+        if len(self._invalidated) > self.maxsize:
+            self._floor = self._invalidated.popitem(last=False)[1]
+
+    def clear(self):
+        """
+        The function removes every entry and makes every pending load stale. The counters are kept.
+        """
+        self._data.clear()
+        self._generation += 1
+        self._floor = self._generation
+        self._invalidated.clear()
+
+    def dump(self) -> list:
+        """
+        The function returns `(key, remaining seconds, value)` for every live entry, least recently used
+        first, e.g. for a warm-restart snapshot.
+        """
+        now = time.monotonic()
+        return [(key, expires - now, value) for key, (expires, value) in self._data.items() if expires > now]
+
+    def restore(self, entries: list):
+        """
+        The function adds the entries returned by `dump`, keeping their remaining lifetime.
+        """
+        now = time.monotonic()
+        for key, remaining, value in entries[-self.maxsize:]:
+            self._data[key] = (now + min(remaining, self.ttl), value)
+            self._data.move_to_end(key)
+
+    def keys(self) -> list:
+        return list(self._data)
+
+    def stats(self) -> dict:
+        """
+        The function returns the current size and the hit/miss/eviction counters.
+        """
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+# The `CacheRegistry` class keeps the named caches of the cogs, so their statistics can be shown in
+# `/metrics` and the Prometheus file.
+class CacheRegistry:
+    def __init__(self):
+        self._caches = {}
+
+    def register(self, name: str, cache: LRUCache):
+        """
+        The function registers a cache under `name`. A reloaded cog replaces its old caches.
+        """
+        self._caches[name] = cache
+
+    def summary(self) -> str:
+        """
+        The function returns one line per cache with its size and hit rate.
+        """
+        lines = []
+        for name, cache in self._caches.items():
+            stats = cache.stats()
+            lookups = stats['hits'] + stats['misses']
+            hit_rate = f'{stats["hits"] / lookups:.0%}' if lookups else '-'
+            lines.append(f'{name}: {stats["size"]}/{stats["maxsize"]}, hit rate {hit_rate}, evictions {stats["evictions"]}')
+        return '\n'.join(lines)
+
+    def prometheus(self) -> str:
+        """
+        The function renders the cache statistics in the Prometheus text exposition format.
+        """
+        stats = {name: cache.stats() for name, cache in self._caches.items()}
+        out = []
+        for field, kind, text in (('size', 'gauge', 'Entries in the cache.'), ('hits', 'counter', 'Cache hits.'),
+                                  ('misses', 'counter', 'Cache misses.'), ('evictions', 'counter', 'Entries evicted for space.')):
+            metric = f'guppi_cache_{field}' + ('_total' if kind == 'counter' else '')
+            out += [f'# HELP {metric} {text}', f'# TYPE {metric} {kind}']
+            out += [f'{metric}{{cache="{name}"}} {values[field]}' for name, values in stats.items()]
+        return '\n'.join(out) + '\n'
+
+caches = CacheRegistry()
@@ -0,0 +1,57 @@
+"""
+Command checks shared by guppi.py and the cogs. They only read the in-memory guild configs, so no
+check touches the database.
+"""
+
+from discord.ext import commands
+from utils.guildconfig import guild_configs
+
+locales = ('en-US', 'de')
+owners = [459747395027075095]
+# Guilds the owner commands are registered in.
+admin_guild_ids = [1109530644578582590]
+# Cogs that can't be disabled per guild, so a server can't lock itself out of its configuration.
+core_cogs = ('setup',)
+
+# The `CogDisabled` class is the check failure for commands of a cog the guild has disabled, so the
+# error handler can answer it differently from other failed checks.
+class CogDisabled(commands.CheckFailure):
+    def __init__(self, cog: str):
+        self.cog = cog
+        super().__init__(f'The {cog} cog is disabled in this guild.')
+
+def cog_name(cog) -> str:
+    """
+    The function returns the name a cog is enabled or disabled by, which is its extension's module name
+    without the package, e.g. `aboutme`.
+    """
+    return type(cog).__module__.rsplit('.', 1)[-1]
+
+def is_authorized(**perms):
+    """
+    The function returns a check that passes for the owners, for members with one of the guild's admin
+    roles and for members with `perms`.
+    """
+    original = commands.has_permissions(**perms).predicate
+    async def extended_check(ctx):
+        if ctx.guild is None:
+            return False
+        if ctx.author.id in owners:
+            return True
+        admin_roles = guild_configs.get(ctx.guild.id).admin_roles
+        if admin_roles and any(role.id in admin_roles for role in getattr(ctx.author, 'roles', ())):
+            return True
+        return await original(ctx)
+    return commands.check(extended_check)
+
+async def cog_enabled(ctx) -> bool:
+    """
+    The global check that rejects commands of cogs the guild has disabled by raising `CogDisabled`.
+    """
+    cog = ctx.command.cog if ctx.command is not None else None
+    if cog is None or ctx.guild_id is None:
+        return True
+    name = cog_name(cog)
+    if name not in core_cogs and not guild_configs.get(ctx.guild_id).cog_enabled(name):
+        raise CogDisabled(name)
+    return True
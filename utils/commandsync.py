@@ -0,0 +1,128 @@
+"""
+Diff-based application command sync. Every top-level command is hashed from its canonical payload,
+including all name and description localizations. Only commands whose hash differs from the one stored
+in bot.db are sent to Discord.
+"""
+
+import json
+import hashlib
+import logging
+from utils.database import db
+from utils.outbound import outbound, USER
+
+logger = logging.getLogger()
+
+def command_payloads(bot) -> dict:
+    """
+    The function returns `{(scope, name, type): payload}` for every pending top-level command, where
+    scope is 0 for global commands and the guild ID for guild commands.
+    """
+    payloads = {}
+    for command in bot.pending_application_commands:
+        payload = command.to_dict()
+        for scope in command.guild_ids or (0,):
+            payloads[(scope, payload['name'], payload.get('type', 1))] = payload
+    return payloads
+
+def command_index(bot) -> dict:
+    """
+    The function returns `{(scope, name, type): command}` for every pending top-level command.
+    """
+    return {(scope, command.name, command.to_dict().get('type', 1)): command for command in bot.pending_application_commands for scope in command.guild_ids or (0,)}
+
+def canonical_hash(payload: dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode()).hexdigest()
+
+def _load_hashes(con) -> dict:
+    return {(scope, name, type_): h for scope, name, type_, h in con.execute('SELECT scope, name, type, hash FROM command_hashes')}
+
+def _store_hashes(con, hashes: dict, replace_all: bool):
+    if replace_all:
+        con.execute('DELETE FROM command_hashes')
+    con.executemany('INSERT INTO command_hashes (scope, name, type, hash) VALUES (?,?,?,?) ON CONFLICT (scope, name, type) DO UPDATE SET hash = excluded.hash',
+                    [(scope, name, type_, h) for (scope, name, type_), h in hashes.items()])
+
+async def registered_commands(bot, scopes) -> dict:
+    """
+    The function returns `{(scope, name, type): id}` of the commands Discord has registered in the
+    global scope and in every guild of `scopes`.
+    """
+    registered = {}
+    for scope in sorted(set(scopes) | {0}):
+        if scope:
+            data = await outbound.submit('commands', lambda scope=scope: bot.http.get_guild_commands(bot.application_id, scope), USER)
+        else:
+            data = await outbound.submit('commands', lambda: bot.http.get_global_commands(bot.application_id), USER)
+        registered.update(((scope, command['name'], command.get('type', 1)), command['id']) for command in data)
+    return registered
+
+def assign_ids(bot, commands: dict, registered: dict) -> int:
+    """
+    The function gives every local command the ID Discord registered it under, so interactions are
+    matched to it by ID, and returns how many commands were matched.
+    """
+    matched = 0
+    for key, command in commands.items():
+        command_id = registered.get(key)
+        if command_id is not None:
+            command.id = command_id
+            bot._application_commands[command_id] = command
+            matched += 1
+    return matched
+
+async def refresh_command_ids(bot) -> int:
+    """
+    The function fetches the registered commands once and assigns their IDs, e.g. when the bot is ready
+    or after an extension was reloaded. Without auto-sync nothing else maps the IDs.
+    """
+    commands = command_index(bot)
+    return assign_ids(bot, commands, await registered_commands(bot, {key[0] for key in commands}))
+
+async def sync_changed(bot, force: bool = False) -> str:
+    """
+    The function syncs the command tree and returns a report of what was sent. Changed and new commands
+    are upserted one by one. If a command was removed, or `force` is set, the whole tree is synced
+    instead. If every hash matches, the commands registered on Discord are compared with the local
+    ones, since they can change without this module, and the whole tree is synced if they differ.
+    """
+    payloads = command_payloads(bot)
+    hashes = {key: canonical_hash(payload) for key, payload in payloads.items()}
+    stored = await db.run(_load_hashes)
+    changed = [key for key, h in hashes.items() if stored.get(key) != h]
+    removed = [key for key in stored if key not in hashes]
+    label = lambda key: f'/{key[1]}' + (f' ({key[0]})' if key[0] else '')
+    commands = command_index(bot)
+    registered = {}
+    drifted = []
+    if not (force or removed or changed):
+        registered = await registered_commands(bot, {key[0] for key in hashes})
+        drifted = sorted(set(hashes) ^ set(registered))
+    if force or removed or drifted:
+        await outbound.submit('commands', lambda: bot.sync_commands(), USER)
+        await db.transaction(_store_hashes, hashes, True)
+        if force:
+            reason = 'forced'
+        elif removed:
+            reason = 'removed ' + ', '.join(label(key) for key in removed)
+        else:
+            reason = 'out of sync with Discord: ' + ', '.join(label(key) for key in drifted)
+        report = f'Full sync ({reason}), {len(hashes)} commands'
+    elif not changed:
+        assign_ids(bot, commands, registered)
+        report = f'All {len(hashes)} commands are up to date'
+    else:
+        for key in changed:
+            scope, name, type_ = key
+            payload = payloads[key]
+            if scope:
+                data = await outbound.submit('commands', lambda: bot.http.upsert_guild_command(bot.application_id, scope, payload), USER)
+            else:
+                data = await outbound.submit('commands', lambda: bot.http.upsert_global_command(bot.application_id, payload), USER)
+            # Interactions are matched to commands by ID first.
+            command = commands[key]
+            command.id = data['id']
+            bot._application_commands[command.id] = command
+            await db.transaction(_store_hashes, {key: hashes[key]}, False)
+        report = 'Updated ' + ', '.join(label(key) for key in changed)
+    logger.info(f'Command sync: {report}')
+    return report
@@ -0,0 +1,158 @@
+"""
+Shared SQLite access for guppi and all cogs. One long-lived connection is owned by a worker thread,
+so no sqlite3 call ever runs on the event loop.
+"""
+
+import sys
+import time
+import queue
+import sqlite3
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from pathlib import Path
+from utils.metrics import metrics
+
+logger = logging.getLogger()
+
+# The `Database` class owns a single sqlite3 connection on a dedicated worker thread and exposes
+# awaitable query/execute/executemany/transaction methods on top of it.
+class Database:
+    def __init__(self, db_path):
+        """
+        The function initializes the database wrapper. The worker thread is started lazily on the
+        first submitted job.
+        """
+        self.db_path = db_path
+        self._jobs = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        The function starts the worker thread that owns the connection if it is not running yet.
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name='guppi-db', daemon=True)
+                self._thread.start()
+
+    def close(self):
+        """
+        The function stops the worker thread after all pending jobs have been processed.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                self._jobs.put(None)
+                self._thread.join()
+            self._thread = None
+
+    def _connect(self):
+        con = sqlite3.connect(self.db_path)
+        # WAL lets readers run while a write is in progress. With WAL, synchronous=NORMAL is still
+        # crash safe and avoids an fsync per commit.
+        con.execute('PRAGMA journal_mode = WAL')
+        con.execute('PRAGMA synchronous = NORMAL')
+        con.execute('PRAGMA cache_size = -16000')
+        con.execute('PRAGMA mmap_size = 268435456')
+        con.execute('PRAGMA temp_store = MEMORY')
+        con.execute('PRAGMA busy_timeout = 5000')
+        # INSERT OR REPLACE only fires the delete triggers of the replaced rows with this on.
+        con.execute('PRAGMA recursive_triggers = ON')
+        # Several worker processes can share the file. Taking the write lock when a transaction starts
+        # makes a second writer wait for busy_timeout instead of failing on a lock upgrade.
+        con.isolation_level = 'IMMEDIATE'
+        return con
+
+    def _worker(self):
+        con = self._connect()
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    break
+                func, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    result = func(con)
+                except BaseException as e:
+                    if con.in_transaction:
+                        con.rollback()
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        finally:
+            con.close()
+
+    def submit(self, func, *args) -> concurrent.futures.Future:
+        """
+        The function queues `func(con, *args)` for the worker thread and returns a
+        `concurrent.futures.Future` for its result.
+        """
+        self.start()
+        future = concurrent.futures.Future()
+        self._jobs.put((lambda con: func(con, *args), future))
+        return future
+
+    def run_sync(self, func, *args):
+        """
+        The function runs `func(con, *args)` on the worker thread and blocks until it is done. It is
+        only meant for boot code that runs before the event loop exists.
+        """
+        return self.submit(func, *args).result()
+
+    async def run(self, func, *args):
+        """
+        The function runs `func(con, *args)` on the worker thread and awaits its result without
+        blocking the event loop. Every call is recorded as one query in `metrics`.
+        """
+        t = time.perf_counter()
+        try:
+            return await asyncio.wrap_future(self.submit(func, *args))
+        finally:
+            metrics.record_query(time.perf_counter() - t)
+
+    async def query(self, sql: str, params=()) -> list:
+        """
+        The function executes a SELECT statement and returns all rows.
+        """
+        return await self.run(lambda con: con.execute(sql, params).fetchall())
+
+    async def query_one(self, sql: str, params=()):
+        """
+        The function executes a SELECT statement and returns the first row or None.
+        """
+        return await self.run(lambda con: con.execute(sql, params).fetchone())
+
+    async def execute(self, sql: str, params=()) -> int:
+        """
+        The function executes a single statement, commits it and returns the affected row count.
+        """
+        def _execute(con):
+            with con:
+                return con.execute(sql, params).rowcount
+        return await self.run(_execute)
+
+    async def executemany(self, sql: str, seq_of_params) -> int:
+        """
+        The function executes a statement for every parameter set in one commit and returns the
+        affected row count. `seq_of_params` may be a generator, it is consumed on the worker thread.
+        """
+        def _executemany(con):
+            with con:
+                return con.executemany(sql, seq_of_params).rowcount
+        return await self.run(_executemany)
+
+    async def transaction(self, func, *args):
+        """
+        The function runs `func(con, *args)` on the worker thread inside a single transaction, which
+        is committed if `func` returns and rolled back if it raises.
+        """
+        def _transaction(con):
+            with con:
+                return func(con, *args)
+        return await self.run(_transaction)
+
+db = Database(Path(sys.path[0], 'bot.db'))
@@ -0,0 +1,126 @@
+"""
+Per-guild configuration. The configs of all joined guilds are loaded in one query when the bot becomes
+ready and served from memory, changes are written through to SQLite immediately.
+"""
+
+import json
+import logging
+from utils.database import db
+
+logger = logging.getLogger()
+
+# The `GuildConfig` class holds the configuration of one guild. Instances are never changed in place,
+# an update replaces the instance in the store.
+class GuildConfig:
+    __slots__ = ('guild_id', 'locale', 'status_channel_id', 'disabled_cogs', 'admin_roles')
+
+    def __init__(self, guild_id: int, locale: str = None, status_channel_id: int = None, disabled_cogs=(), admin_roles=()):
+        self.guild_id = guild_id
+        self.locale = locale
+        self.status_channel_id = status_channel_id
+        self.disabled_cogs = frozenset(disabled_cogs)
+        self.admin_roles = frozenset(admin_roles)
+
+    def replace(self, **changes) -> 'GuildConfig':
+        """
+        The function returns a copy of the config with `changes` applied.
+        """
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return GuildConfig(**values)
+
+    def cog_enabled(self, cog: str) -> bool:
+        return cog not in self.disabled_cogs
+
+    def to_row(self) -> tuple:
+        return (self.guild_id, self.locale, self.status_channel_id, json.dumps(sorted(self.disabled_cogs)), json.dumps(sorted(self.admin_roles)))
+
+    @classmethod
+    def from_row(cls, row) -> 'GuildConfig':
+        guild_id, locale, status_channel_id, disabled_cogs, admin_roles = row
+        return cls(guild_id, locale, status_channel_id, json.loads(disabled_cogs), json.loads(admin_roles))
+
+# The `GuildConfigStore` class maps guild IDs to their `GuildConfig`. Guilds without a stored config get
+# the defaults, so reading a config never touches the database.
+class GuildConfigStore:
+    def __init__(self, db):
+        self.db = db
+        self._configs = {}
+
+    def __len__(self):
+        return len(self._configs)
+
+    def snapshot(self) -> dict:
+        return dict(self._configs)
+
+    def restore(self, configs: dict):
+        """
+        The function puts back the configs of a warm-restart snapshot. `load` on ready checks them
+        against the database.
+        """
+        self._configs = dict(configs)
+
+    async def load(self, guild_ids) -> int:
+        """
+        The function replaces the in-memory map with the stored configs of `guild_ids` in a single
+        query and returns how many were found.
+        """
+        rows = await self.db.query('''SELECT guild_id, locale, status_channel_id, disabled_cogs, admin_roles FROM guild_config
+                                      WHERE guild_id IN (SELECT value FROM json_each(?))''', (json.dumps(list(guild_ids)),))
+        self._configs = {row[0]: GuildConfig.from_row(row) for row in rows}
+        return len(self._configs)
+
+    async def load_guild(self, guild_id: int):
+        """
+        The function loads the stored config of a single guild, e.g. after the bot joined it.
+        """
+        row = await self.db.query_one('SELECT guild_id, locale, status_channel_id, disabled_cogs, admin_roles FROM guild_config WHERE guild_id = ?', (guild_id,))
+        if row is not None:
+            self._configs[guild_id] = GuildConfig.from_row(row)
+
+    def forget(self, guild_id: int):
+        """
+        The function drops a guild from memory. Its stored config is kept in case the bot is added again.
+        """
+        self._configs.pop(guild_id, None)
+
+    def get(self, guild_id: int) -> GuildConfig:
+        """
+        The function returns the config of a guild, or the defaults if none is stored.
+        """
+        config = self._configs.get(guild_id)
+        return config if config is not None else GuildConfig(guild_id)
+
+    def configs(self) -> list:
+        """
+        The function returns the stored configs of all joined guilds.
+        """
+        return list(self._configs.values())
+
+    async def update(self, guild_id: int, **changes) -> GuildConfig:
+        """
+        The function writes the changed config through to the database and then replaces it in memory.
+        """
+        config = self.get(guild_id).replace(**changes)
+        await self.db.transaction(_write_config, config.to_row())
+        self._configs[guild_id] = config
+        return config
+
+    def locale_for(self, ctx) -> str:
+        """
+        The function returns the locale to answer an interaction or context in: the guild's override if
+        one is set, the user's locale otherwise.
+        """
+        guild_id = getattr(ctx, 'guild_id', None)
+        if guild_id is not None:
+            config = self._configs.get(guild_id)
+            if config is not None and config.locale:
+                return config.locale
+        return ctx.locale
+
+def _write_config(con, row: tuple):
+    con.execute('''INSERT INTO guild_config (guild_id, locale, status_channel_id, disabled_cogs, admin_roles) VALUES (?,?,?,?,?)
+                   ON CONFLICT (guild_id) DO UPDATE SET locale = excluded.locale, status_channel_id = excluded.status_channel_id,
+                   disabled_cogs = excluded.disabled_cogs, admin_roles = excluded.admin_roles''', row)
+
+guild_configs = GuildConfigStore(db)
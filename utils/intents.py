@@ -0,0 +1,114 @@
+"""
+Capability-driven gateway configuration. Every cog declares the intents and caches it needs in a
+module-level `bot_capabilities` literal, and the bot is built with the union of those instead of
+`discord.Intents.all()`.
+"""
+
+import ast
+import sys
+import logging
+import traceback
+import discord
+from pathlib import Path
+
+logger = logging.getLogger()
+
+default_capabilities = {'intents': (), 'member_cache': (), 'message_cache': 0, 'chunk_at_startup': False}
+# Commands are only registered through utils/commandsync.py. py-cord's automatic sync would overwrite
+# the whole tree with a bulk request whenever an interaction names a command that isn't loaded yet,
+# e.g. the first use of a lazy extension.
+bot_options = {'auto_sync_commands': False}
+
+def read_literal(extension: str, name: str, default=None):
+    """
+    The function reads a module-level literal assignment of an extension from its source without
+    importing it, e.g. because the bot has to be created before any extension is loaded.
+    """
+    value = default
+    try:
+        path = Path(sys.path[0], *extension.split('.')).with_suffix('.py')
+        tree = ast.parse(path.read_text(encoding='utf-8'))
+        for node in tree.body:
+            if isinstance(node, ast.Assign) and any(isinstance(t, ast.Name) and t.id == name for t in node.targets):
+                value = ast.literal_eval(node.value)
+    except:logger.error(traceback.format_exc())
+    return value
+
+def read_capabilities(extension: str) -> dict:
+    """
+    The function reads the `bot_capabilities` literal of an extension.
+    """
+    capabilities = dict(default_capabilities)
+    capabilities.update(read_literal(extension, 'bot_capabilities', {}))
+    return capabilities
+
+def build_gateway_config(extensions, core: dict, profile: str = 'minimal') -> dict:
+    """
+    The function returns the keyword arguments for `discord.Bot` that cover the needs of `core` and
+    every extension. The `all` profile restores the old everything-enabled behaviour for comparison.
+    """
+    if profile == 'all':
+        return {
+            **bot_options,
+            'intents': discord.Intents.all(),
+            'member_cache_flags': discord.MemberCacheFlags.all(),
+            'max_messages': 1000,
+            'chunk_guilds_at_startup': True,
+        }
+    needs = [dict(default_capabilities, **core)] + [read_capabilities(extension) for extension in extensions]
+    intents = discord.Intents.none()
+    member_cache = discord.MemberCacheFlags.none()
+    for capabilities in needs:
+        for name in capabilities['intents']:
+            setattr(intents, name, True)
+        for name in capabilities['member_cache']:
+            setattr(member_cache, name, True)
+    max_messages = max(capabilities['message_cache'] for capabilities in needs)
+    return {
+        **bot_options,
+        'intents': intents,
+        'member_cache_flags': member_cache,
+        'max_messages': max_messages or None,
+        'chunk_guilds_at_startup': any(capabilities['chunk_at_startup'] for capabilities in needs),
+    }
+
+def process_rss() -> int:
+    """
+    The function returns the resident set size of the process in bytes, or the peak RSS where the
+    current value is not available.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def cache_report(bot: discord.Bot, profile: str) -> str:
+    """
+    The function describes the active gateway configuration together with the process RSS and the
+    number of entries in each cache.
+    """
+    intents = [name for name, enabled in bot.intents if enabled]
+    member_cache = [name for name, enabled in bot._connection.member_cache_flags if enabled]
+    lines = [
+        f'profile: {profile}',
+        f'intents: {", ".join(intents) or "none"}',
+        f'member cache: {", ".join(member_cache) or "none"}',
+        f'message cache: {bot._connection.max_messages or 0}',
+        f'RSS: {process_rss() / 1024 / 1024:.1f} MiB',
+        f'guilds: {len(bot.guilds)}',
+        f'channels: {sum(len(guild.channels) for guild in bot.guilds)}',
+        f'members: {sum(len(guild.members) for guild in bot.guilds)}',
+        f'users: {len(bot.users)}',
+        f'cached messages: {len(bot.cached_messages)}',
+        f'emojis: {len(bot.emojis)}',
+    ]
+    return '\n'.join(lines)
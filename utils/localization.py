@@ -0,0 +1,183 @@
+"""
+Shared localization catalog. Every `Localization/*-locale.json` file is parsed once into read-only
+lookup tables, locale fallbacks are resolved once, and a file is only read again after its mtime
+changes.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import traceback
+from types import MappingProxyType
+from pathlib import Path
+
+logger = logging.getLogger()
+
+# The `_Section` class is a read-only view of the strings of one function, e.g.
+# `Localization('de').clear_msgs`, that allows attribute access like the old per-cog classes did.
+class _Section:
+    __slots__ = ('_values',)
+
+    def __init__(self, values):
+        object.__setattr__(self, '_values', MappingProxyType(values))
+
+    def __getattr__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        raise AttributeError('localization sections are read-only')
+
+# The `_Table` class holds the sections of one file name (cog) for one resolved locale chain.
+class _Table:
+    __slots__ = ('locale', 'file_name', '_sections')
+
+    def __init__(self, locale, file_name, sections):
+        object.__setattr__(self, 'locale', locale)
+        object.__setattr__(self, 'file_name', file_name)
+        object.__setattr__(self, '_sections', MappingProxyType(sections))
+
+    def __getattr__(self, name):
+        try:
+            return self._sections[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        raise AttributeError('localization tables are read-only')
+
+# The `LocaleCatalog` class loads the locale files, resolves fallbacks and hands out cached tables.
+class LocaleCatalog:
+    def __init__(self, directory, default_locale: str = 'en-US', check_interval: float = 5.0):
+        """
+        The function initializes the catalog. Files are loaded lazily and checked for changes at most
+        once every `check_interval` seconds.
+        """
+        self.directory = Path(directory)
+        self.default_locale = default_locale
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._files = {}
+        self._chains = {}
+        self._tables = {}
+        self._last_check = None
+
+    def _scan(self):
+        """
+        The function stats the locale directory and (re)loads every file whose mtime changed. It
+        returns True if anything changed.
+        """
+        changed = False
+        seen = set()
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            if not entry.name.endswith('-locale.json'):
+                continue
+            locale = entry.name[:-len('-locale.json')]
+            seen.add(locale)
+            mtime = entry.stat().st_mtime_ns
+            cached = self._files.get(locale)
+            if cached is not None and cached[0] == mtime:
+                continue
+            try:
+                with open(entry.path, encoding='utf-8') as f:
+                    content = json.load(f)
+                self._files[locale] = (mtime, content)
+                changed = True
+                if cached is not None:
+                    logger.info(f'Reloaded localization file {entry.name}')
+            except:logger.error(traceback.format_exc())
+        for locale in set(self._files) - seen:
+            del self._files[locale]
+            changed = True
+        if changed:
+            self._chains.clear()
+            self._tables.clear()
+        return changed
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if self._last_check is None or now - self._last_check >= self.check_interval:
+            self._last_check = now
+            self._scan()
+
+    @property
+    def locales(self) -> tuple:
+        """
+        The function returns the locales that have a file in the catalog.
+        """
+        with self._lock:
+            self._maybe_reload()
+            return tuple(self._files)
+
+    def resolve(self, locale: str) -> tuple:
+        """
+        The function returns the fallback chain for a locale, e.g. `de-DE` resolves to `de-DE`, `de`,
+        any other `de-*` file and finally the default locale, keeping only locales that have a file.
+        """
+        with self._lock:
+            self._maybe_reload()
+            chain = self._chains.get(locale)
+            if chain is None:
+                candidates = [locale]
+                base = (locale or '').split('-')[0]
+                candidates.append(base)
+                candidates.extend(sorted(l for l in self._files if l.split('-')[0] == base))
+                candidates.append(self.default_locale)
+                chain = tuple(dict.fromkeys(c for c in candidates if c in self._files))
+                self._chains[locale] = chain
+            return chain
+
+    def get(self, locale: str, file_name: str) -> _Table:
+        """
+        The function returns the read-only table of strings for `file_name` in `locale`. Keys missing
+        in a locale fall back along its chain.
+        """
+        with self._lock:
+            chain = self.resolve(locale)
+            table = self._tables.get((chain, file_name))
+            if table is None:
+                sections = {}
+                for l in reversed(chain):
+                    for function, values in self._files[l][1].get(file_name, {}).items():
+                        sections.setdefault(function, {}).update(values)
+                table = _Table(chain[0] if chain else locale, file_name, {f: _Section(v) for f, v in sections.items()})
+                self._tables[(chain, file_name)] = table
+            return table
+
+    def snapshot(self) -> dict:
+        """
+        The function returns the parsed locale files with their mtimes for a warm-restart snapshot.
+        """
+        with self._lock:
+            return dict(self._files)
+
+    def restore(self, files: dict):
+        """
+        The function puts back the files returned by `snapshot`. They are checked against the mtimes on
+        disk at the next scan like any loaded file.
+        """
+        with self._lock:
+            self._files = dict(files)
+            self._chains.clear()
+            self._tables.clear()
+            self._last_check = time.monotonic()
+
+    def bind(self, file_name: str):
+        """
+        The function returns a `Localization(locale)` callable for one cog, matching the interface of
+        the old per-cog `Localization` classes.
+        """
+        def Localization(locale):
+            return self.get(locale, file_name)
+        return Localization
+
+catalog = LocaleCatalog(Path(sys.path[0], 'Localization'))
@@ -0,0 +1,118 @@
+"""
+Logging setup. Records are handed to a queue on the event loop and written by a listener thread to a
+rotating, gzip-compressed log file.
+"""
+
+import os
+import gzip
+import queue
+import shutil
+import atexit
+import logging
+import datetime
+import logging.handlers
+
+log_format = '%(asctime)s.%(msecs)03d %(name)s %(levelname)s %(message)s'
+log_datefmt = '%Y-%m-%d %H:%M:%S'
+
+# The `CompressingRotatingFileHandler` class rotates the log once it exceeds `maxBytes` or a new day
+# starts, and gzips the rotated segments (`bot.log.1.gz`, `bot.log.2.gz`, ...).
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    def __init__(self, filename, maxBytes=0, backupCount=0, encoding=None):
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding)
+        try:
+            self._day = datetime.date.fromtimestamp(os.path.getmtime(self.baseFilename))
+        except OSError:
+            self._day = datetime.date.today()
+
+    def namer(self, name):
+        return name + '.gz'
+
+    def rotator(self, source, dest):
+        with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(source)
+
+    def shouldRollover(self, record):
+        if datetime.date.fromtimestamp(record.created) != self._day and os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self._day = datetime.date.today()
+
+def setup_logging(logname, max_bytes: int = 5 * 1024 * 1024, backup_count: int = 10) -> logging.handlers.QueueListener:
+    """
+    The function routes the root logger through a `QueueHandler` and starts a `QueueListener` that
+    writes to a rotating log file. It returns the listener, which should be stopped before the
+    process exits or execs to flush pending records.
+    """
+    handler = CompressingRotatingFileHandler(logname, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    handler.setFormatter(logging.Formatter(log_format, datefmt=log_datefmt))
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_logging, listener)
+    return listener
+
+def stop_logging(listener: logging.handlers.QueueListener):
+    """
+    The function flushes pending records and stops the listener. It is safe to call more than once.
+    """
+    if listener._thread is not None:
+        listener.stop()
+
+def _parse_time(line: bytes):
+    try:
+        return datetime.datetime.strptime(line[:19].decode('ascii'), log_datefmt)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def _first_time(lines):
+    for line in lines:
+        stamp = _parse_time(line)
+        if stamp is not None:
+            return stamp
+    return None
+
+def read_tail(logname, max_bytes: int, since: datetime.datetime = None, block_size: int = 64 * 1024) -> bytes:
+    """
+    The function returns the end of the log file without loading the whole file. It reads blocks
+    backwards from the end until it has `max_bytes`, or, if `since` is given, until it reaches a record
+    older than `since`. The result always starts at the beginning of a line.
+    """
+    with open(logname, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b''
+        while pos > 0 and len(data) < max_bytes:
+            read = min(block_size, pos)
+            pos -= read
+            f.seek(pos)
+            block = f.read(read)
+            data = block + data
+            if since is not None:
+                # The first line of a block may be cut off, so it is skipped until the start of the file is reached.
+                stamp = _first_time(block.split(b'\n')[1:] if pos > 0 else block.split(b'\n'))
+                if stamp is not None and stamp < since:
+                    break
+    lines = data.split(b'\n')
+    if pos > 0:
+        lines = lines[1:]
+    if since is not None:
+        for i, line in enumerate(lines):
+            stamp = _parse_time(line)
+            if stamp is not None and stamp >= since:
+                lines = lines[i:]
+                break
+        else:
+            lines = []
+    data = b'\n'.join(lines)
+    if len(data) > max_bytes:
+        data = data[-max_bytes:]
+        data = data[data.find(b'\n') + 1:]
+    return data
@@ -0,0 +1,197 @@
+"""
+Lightweight instrumentation for commands, UI callbacks and loops. Latency histograms, error counts and
+the SQLite queries of each invocation are kept in memory and can be rendered in the Prometheus text
+format.
+"""
+
+import os
+import time
+import logging
+import functools
+import contextvars
+
+buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# The `Histogram` class counts observations into fixed cumulative buckets like a Prometheus histogram.
+class Histogram:
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(buckets)
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """
+        The function estimates a quantile as the upper bound of the bucket it falls into.
+        """
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return buckets[i] if i < len(buckets) else float('inf')
+        return float('inf')
+
+# The `HandlerStats` class holds everything recorded for one handler.
+class HandlerStats:
+    __slots__ = ('latency', 'errors', 'db_queries', 'db_seconds')
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = 0
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+# The `_Invocation` class collects the database queries and errors of one running handler.
+class _Invocation:
+    __slots__ = ('db_queries', 'db_seconds', 'error')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.error = False
+
+_current = contextvars.ContextVar('guppi_invocation', default=None)
+
+# The `Metrics` class is the registry all instrumented handlers report to.
+class Metrics:
+    def __init__(self):
+        self.handlers = {}
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.started = time.time()
+        self.collectors = []
+
+    def timed(self, name: str):
+        """
+        The function returns a decorator that records the latency, errors and database queries of every
+        call of the decorated coroutine function under `name`. Errors that the handler only logs are
+        counted as well, see `ErrorCounter`.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                invocation = _Invocation()
+                token = _current.set(invocation)
+                t = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except BaseException:
+                    invocation.error = True
+                    raise
+                finally:
+                    _current.reset(token)
+                    self.observe(name, time.perf_counter() - t, invocation)
+            return wrapper
+        return decorator
+
+    def observe(self, name: str, seconds: float, invocation: _Invocation):
+        stats = self.handlers.get(name)
+        if stats is None:
+            stats = self.handlers[name] = HandlerStats()
+        stats.latency.observe(seconds)
+        stats.errors += invocation.error
+        stats.db_queries += invocation.db_queries
+        stats.db_seconds += invocation.db_seconds
+
+    def record_query(self, seconds: float):
+        """
+        The function records one database query, attributing it to the running handler if there is one.
+        """
+        self.db_queries += 1
+        self.db_seconds += seconds
+        invocation = _current.get()
+        if invocation is not None:
+            invocation.db_queries += 1
+            invocation.db_seconds += seconds
+
+    def summary(self) -> str:
+        """
+        The function returns a fixed-width table of all handlers for display in Discord.
+        """
+        lines = [f'{"handler":<28}{"calls":>7}{"err":>5}{"avg ms":>8}{"p95 ms":>8}{"db q":>6}{"db ms":>7}']
+        for name, stats in sorted(self.handlers.items()):
+            calls = stats.latency.count or 1
+            lines.append(
+                f'{name[:27]:<28}{stats.latency.count:>7}{stats.errors:>5}'
+                f'{stats.latency.sum / calls * 1000:>8.1f}{stats.latency.quantile(0.95) * 1000:>8.0f}'
+                f'{stats.db_queries / calls:>6.1f}{stats.db_seconds / calls * 1000:>7.1f}'
+            )
+        lines.append(f'db queries: {self.db_queries}, db time: {self.db_seconds:.2f}s')
+        return '\n'.join(lines)
+
+    def prometheus(self) -> str:
+        """
+        The function renders all metrics in the Prometheus text exposition format.
+        """
+        out = [
+            '# HELP guppi_handler_duration_seconds Latency of commands, UI callbacks and loops.',
+            '# TYPE guppi_handler_duration_seconds histogram',
+        ]
+        for name, stats in sorted(self.handlers.items()):
+            label = _label(name)
+            seen = 0
+            for bound, n in zip(buckets + ('+Inf',), stats.latency.counts):
+                seen += n
+                out.append(f'guppi_handler_duration_seconds_bucket{{handler="{label}",le="{bound}"}} {seen}')
+            out.append(f'guppi_handler_duration_seconds_sum{{handler="{label}"}} {stats.latency.sum}')
+            out.append(f'guppi_handler_duration_seconds_count{{handler="{label}"}} {stats.latency.count}')
+        for metric, attr, help_text in (
+            ('guppi_handler_errors_total', 'errors', 'Invocations that raised or logged an error.'),
+            ('guppi_handler_db_queries_total', 'db_queries', 'SQLite queries run by a handler.'),
+            ('guppi_handler_db_seconds_total', 'db_seconds', 'Time spent waiting for SQLite queries by a handler.'),
+        ):
+            out.append(f'# HELP {metric} {help_text}')
+            out.append(f'# TYPE {metric} counter')
+            for name, stats in sorted(self.handlers.items()):
+                out.append(f'{metric}{{handler="{_label(name)}"}} {getattr(stats, attr)}')
+        out += [
+            '# HELP guppi_db_queries_total All SQLite queries.',
+            '# TYPE guppi_db_queries_total counter',
+            f'guppi_db_queries_total {self.db_queries}',
+            '# HELP guppi_db_seconds_total Time spent waiting for all SQLite queries.',
+            '# TYPE guppi_db_seconds_total counter',
+            f'guppi_db_seconds_total {self.db_seconds}',
+        ]
+        # Other subsystems register a callable returning their own exposition text.
+        return '\n'.join(out) + '\n' + ''.join(collector() for collector in self.collectors)
+
+    def write_prometheus(self, path):
+        """
+        The function atomically writes the Prometheus text to `path`.
+        """
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus())
+        os.replace(tmp, path)
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# The `ErrorCounter` class is a logging handler that marks the running invocation as failed when an
+# error is logged, since most handlers catch their exceptions and only log the traceback.
+class ErrorCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+
+    def emit(self, record):
+        invocation = _current.get()
+        if invocation is not None:
+            invocation.error = True
+
+metrics = Metrics()
+timed = metrics.timed
+logging.getLogger().addHandler(ErrorCounter())
@@ -0,0 +1,172 @@
+"""
+Versioned schema migrations for bot.db. `migrate` runs once at boot, so no DDL runs at request time.
+Append new migrations to `migrations`, never change one that has shipped.
+"""
+
+import time
+import logging
+from utils.birthdays import parse_birthday, format_birthday
+
+logger = logging.getLogger()
+
+def _settings_primary_key(con):
+    con.execute('CREATE TABLE IF NOT EXISTS settings(setting TEXT, value TEXT)')
+    con.execute('CREATE TABLE settings_new (setting TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID')
+    # Older versions could insert a setting twice, the most recently written non-empty value wins.
+    con.execute('''INSERT INTO settings_new (setting, value)
+                   SELECT setting, value FROM settings AS s
+                   WHERE setting IS NOT NULL AND rowid = (
+                       SELECT rowid FROM settings WHERE setting = s.setting
+                       ORDER BY value IS NULL, rowid DESC LIMIT 1)''')
+    con.execute('DROP TABLE settings')
+    con.execute('ALTER TABLE settings_new RENAME TO settings')
+
+def _aboutme_table(con):
+    con.execute("CREATE TABLE IF NOT EXISTS aboutme (user_id INTEGER NOT NULL, info TEXT NOT NULL, value TEXT, toggle INTEGER DEFAULT 1 CHECK (toggle < 2), PRIMARY KEY (user_id, info))")
+    # Rows that only hold the default value and toggle were written by the old per-user backfill, the
+    # profile resolves to the same values without them.
+    con.execute('DELETE FROM aboutme WHERE value IS NULL AND toggle = 1')
+
+def _startup_phases(con):
+    con.execute('''CREATE TABLE IF NOT EXISTS startup_phases
+                (slot INTEGER NOT NULL, boot INTEGER NOT NULL, phase TEXT NOT NULL, seconds REAL NOT NULL,
+                PRIMARY KEY (slot, phase))''')
+    con.execute('CREATE INDEX IF NOT EXISTS startup_phases_phase ON startup_phases (phase, boot)')
+    columns = [row[1] for row in con.execute('PRAGMA table_info(startup_times)')]
+    if columns == ['startup_time']:
+        old = [row[0] for row in con.execute('SELECT startup_time FROM startup_times ORDER BY rowid')][-20:]
+        con.executemany('INSERT OR REPLACE INTO startup_phases (slot, boot, phase, seconds) VALUES (?,?,?,?)',
+                        [(boot % 20, boot, 'total', seconds) for boot, seconds in enumerate(old, 1)])
+        con.execute('DROP TABLE startup_times')
+
+def _birthdays(con):
+    con.execute('''CREATE TABLE IF NOT EXISTS birthdays
+                (user_id INTEGER PRIMARY KEY, year INTEGER NOT NULL, month INTEGER NOT NULL, day INTEGER NOT NULL)''')
+    rows = con.execute("SELECT user_id, value FROM aboutme WHERE info = 'birthday' AND value IS NOT NULL").fetchall()
+    parsed = [(user_id, parse_birthday(value)) for user_id, value in rows]
+    parsed = [(user_id, birthdate) for user_id, birthdate in parsed if birthdate is not None]
+    con.executemany('INSERT OR REPLACE INTO birthdays (user_id, year, month, day) VALUES (?,?,?,?)',
+                    [(user_id, b.year, b.month, b.day) for user_id, b in parsed])
+    con.executemany("UPDATE aboutme SET value = ? WHERE user_id = ? AND info = 'birthday'",
+                    [(format_birthday(b), user_id) for user_id, b in parsed])
+
+def _guild_config(con):
+    con.execute('''CREATE TABLE IF NOT EXISTS guild_config
+                (guild_id INTEGER PRIMARY KEY, locale TEXT, status_channel_id INTEGER,
+                disabled_cogs TEXT NOT NULL DEFAULT '[]', admin_roles TEXT NOT NULL DEFAULT '[]')''')
+
+def _shard_status(con):
+    con.execute('''CREATE TABLE IF NOT EXISTS shard_status
+                (shard_id INTEGER PRIMARY KEY, worker INTEGER NOT NULL, pid INTEGER NOT NULL, guilds INTEGER NOT NULL,
+                latency REAL, updated_at REAL NOT NULL)''')
+
+def _command_hashes(con):
+    # Global commands are stored with scope 0, guild commands with their guild ID.
+    con.execute('''CREATE TABLE IF NOT EXISTS command_hashes
+                (scope INTEGER NOT NULL, name TEXT NOT NULL, type INTEGER NOT NULL, hash TEXT NOT NULL,
+                PRIMARY KEY (scope, name, type)) WITHOUT ROWID''')
+
+def _birthday_month_day(con):
+    # month_day sorts birthdays through the year, e.g. 1224 for the 24th of December. The index holds
+    # the year and the user ID as well, so birthday lookups never touch the table.
+    con.execute('ALTER TABLE birthdays ADD COLUMN month_day INTEGER GENERATED ALWAYS AS (month * 100 + day) VIRTUAL')
+    con.execute('CREATE INDEX IF NOT EXISTS birthdays_month_day ON birthdays (month_day, year)')
+
+def _aboutme_fts(con):
+    # The index shares its rowids with aboutme and only holds visible values, the triggers keep it in sync
+    # for every write path.
+    con.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS aboutme_fts USING fts5
+                (value, info UNINDEXED, user_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')''')
+    con.execute('''CREATE TRIGGER IF NOT EXISTS aboutme_fts_insert AFTER INSERT ON aboutme
+                   WHEN new.toggle = 1 AND new.value IS NOT NULL BEGIN
+                       INSERT INTO aboutme_fts (rowid, value, info, user_id) VALUES (new.rowid, new.value, new.info, new.user_id);
+                   END''')
+    con.execute('''CREATE TRIGGER IF NOT EXISTS aboutme_fts_delete AFTER DELETE ON aboutme BEGIN
+                       DELETE FROM aboutme_fts WHERE rowid = old.rowid;
+                   END''')
+    con.execute('''CREATE TRIGGER IF NOT EXISTS aboutme_fts_update AFTER UPDATE OF value, toggle ON aboutme BEGIN
+                       DELETE FROM aboutme_fts WHERE rowid = old.rowid;
+                       INSERT INTO aboutme_fts (rowid, value, info, user_id)
+                       SELECT new.rowid, new.value, new.info, new.user_id WHERE new.toggle = 1 AND new.value IS NOT NULL;
+                   END''')
+    con.execute('''INSERT INTO aboutme_fts (rowid, value, info, user_id)
+                   SELECT rowid, value, info, user_id FROM aboutme WHERE toggle = 1 AND value IS NOT NULL''')
+
+def _aboutme_fts_guilds(con):
+    # Search is scoped to a guild inside the index. Every row carries the guilds its user used Aboutme in
+    # as `g<id>` tokens, so a query only walks the rows of one guild.
+    con.execute('''CREATE TABLE IF NOT EXISTS aboutme_guilds (
+                user_id INTEGER NOT NULL,
+                guild_id INTEGER NOT NULL,
+                PRIMARY KEY (user_id, guild_id)) WITHOUT ROWID''')
+    for trigger in ('aboutme_fts_insert', 'aboutme_fts_delete', 'aboutme_fts_update'):
+        con.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    con.execute('DROP TABLE IF EXISTS aboutme_fts')
+    con.execute('''CREATE VIRTUAL TABLE aboutme_fts USING fts5
+                (value, guilds, info UNINDEXED, user_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')''')
+    guilds = lambda user_id: f"(SELECT group_concat('g' || guild_id, ' ') FROM aboutme_guilds WHERE user_id = {user_id})"
+    con.execute(f'''CREATE TRIGGER aboutme_fts_insert AFTER INSERT ON aboutme
+                    WHEN new.toggle = 1 AND new.value IS NOT NULL BEGIN
+                        INSERT INTO aboutme_fts (rowid, value, guilds, info, user_id) VALUES (new.rowid, new.value, {guilds('new.user_id')}, new.info, new.user_id);
+                    END''')
+    con.execute('''CREATE TRIGGER aboutme_fts_delete AFTER DELETE ON aboutme BEGIN
+                       DELETE FROM aboutme_fts WHERE rowid = old.rowid;
+                   END''')
+    con.execute(f'''CREATE TRIGGER aboutme_fts_update AFTER UPDATE OF value, toggle ON aboutme BEGIN
+                        DELETE FROM aboutme_fts WHERE rowid = old.rowid;
+                        INSERT INTO aboutme_fts (rowid, value, guilds, info, user_id)
+                        SELECT new.rowid, new.value, {guilds('new.user_id')}, new.info, new.user_id WHERE new.toggle = 1 AND new.value IS NOT NULL;
+                    END''')
+    for event, row in (('INSERT', 'new'), ('DELETE', 'old')):
+        con.execute(f'''CREATE TRIGGER IF NOT EXISTS aboutme_guilds_{event.lower()} AFTER {event} ON aboutme_guilds BEGIN
+                            UPDATE aboutme_fts SET guilds = {guilds(f'{row}.user_id')}
+                            WHERE rowid IN (SELECT rowid FROM aboutme WHERE user_id = {row}.user_id);
+                        END''')
+    con.execute(f'''INSERT INTO aboutme_fts (rowid, value, guilds, info, user_id)
+                    SELECT rowid, value, {guilds('aboutme.user_id')}, info, user_id FROM aboutme WHERE toggle = 1 AND value IS NOT NULL''')
+
+def _aboutme_guild_members(con):
+    con.execute('CREATE INDEX IF NOT EXISTS aboutme_guilds_guild ON aboutme_guilds (guild_id, user_id)')
+
+migrations = [
+    (1, 'settings primary key', _settings_primary_key),
+    (2, 'aboutme table', _aboutme_table),
+    (3, 'startup phases ring buffer', _startup_phases),
+    (4, 'normalized birthdays', _birthdays),
+    (5, 'guild config', _guild_config),
+    (6, 'shard status', _shard_status),
+    (7, 'command hashes', _command_hashes),
+    (8, 'birthday month/day index', _birthday_month_day),
+    (9, 'aboutme full-text search', _aboutme_fts),
+    (10, 'guild-scoped aboutme search', _aboutme_fts_guilds),
+    (11, 'aboutme guild member index', _aboutme_guild_members),
+]
+
+def migrate(con) -> list:
+    """
+    The function applies every migration that is not recorded in `schema_migrations` yet, each in its
+    own transaction, and returns the versions it applied.
+    """
+    con.execute('CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at REAL NOT NULL)')
+    applied = {row[0] for row in con.execute('SELECT version FROM schema_migrations')}
+    done = []
+    for version, name, func in migrations:
+        if version in applied:
+            continue
+        # DDL does not open a transaction implicitly, so it is started explicitly to keep each
+        # migration atomic. It takes the write lock right away and checks again, since another worker
+        # process may have applied the migration in the meantime.
+        con.execute('BEGIN IMMEDIATE')
+        if con.execute('SELECT 1 FROM schema_migrations WHERE version = ?', (version,)).fetchone():
+            con.rollback()
+            continue
+        try:
+            func(con)
+            con.execute('INSERT INTO schema_migrations (version, name, applied_at) VALUES (?,?,?)', (version, name, time.time()))
+            con.commit()
+        except:
+            con.rollback()
+            raise
+        logger.info(f'Applied migration {version}: {name}')
+        done.append(version)
+    return done
@@ -0,0 +1,251 @@
+"""
+Outbound request scheduler. Background and user-triggered Discord requests are queued by priority and
+sent through a token bucket per route, and held back while an interaction still waits for its
+response. Repeated requests with the same key are coalesced, so only the latest one is sent.
+"""
+
+import time
+import asyncio
+import contextvars
+import logging
+from collections import deque, Counter
+
+logger = logging.getLogger()
+
+INTERACTION, USER, BACKGROUND = 0, 1, 2
+priority_names = {INTERACTION: 'interaction', USER: 'user', BACKGROUND: 'background'}
+
+# The `TokenBucket` class allows `rate` requests per second with bursts of up to `capacity`.
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """
+        The function returns how many seconds it takes until a token is available, 0 if one is.
+        """
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+# The `_Job` class is one queued request.
+class _Job:
+    __slots__ = ('route', 'major', 'priority', 'factory', 'key', 'future', 'queued', 'deferred')
+
+    def __init__(self, route, major, priority, factory, key, future):
+        self.route = route
+        self.major = major
+        self.priority = priority
+        self.factory = factory
+        self.key = key
+        self.future = future
+        self.queued = time.monotonic()
+        self.deferred = False
+
+# The `OutboundScheduler` class owns the queues, the token buckets and the worker task that sends the
+# queued requests.
+class OutboundScheduler:
+    # Requests per second and burst size of each route, `None` means the route is not limited here.
+    route_limits = {
+        'interaction': None,
+        'interaction_edit': (1.0, 5),
+        'message_edit': (1.0, 5),
+        'message_send': (1.0, 5),
+        'message_delete': (5.0, 5),
+        'bulk_delete': (1.0, 2),
+        'presence': (5 / 60, 5),
+        'commands': (0.25, 5),
+    }
+    default_limit = (1.0, 5)
+    # Interactions have to be answered within 3 seconds, lower priority work waits at most that long.
+    interaction_deadline = 3.0
+
+    def __init__(self):
+        self._queues = {priority: deque() for priority in priority_names}
+        self._keyed = {}
+        self._running_keys = set()
+        self._buckets = {}
+        self._interactions = {}
+        self._wakeup = None
+        self._task = None
+        self._running = set()
+        self.sent = Counter()
+        self.failed = 0
+        self.coalesced = 0
+        self.deferred_by_interaction = 0
+        self.deferred_by_bucket = 0
+        self.max_wait = {priority: 0.0 for priority in priority_names}
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            # The worker sends requests of every caller, so it must not inherit the context of the first
+            # one, e.g. the invocation `utils.metrics` attributes queries to.
+            self._task = loop.create_task(self._worker(), context=contextvars.Context())
+
+    def submit(self, route: str, factory, priority: int = BACKGROUND, key=None, major=None) -> asyncio.Future:
+        """
+        The function queues `factory()`, a callable returning the request coroutine, and returns a
+        future for its result. If a request with the same `key` is still queued, its factory is
+        replaced instead and the existing future is returned. `major` splits a route into separate
+        buckets, e.g. per channel.
+        """
+        self._ensure_worker()
+        if key is not None:
+            job = self._keyed.get(key)
+            if job is not None:
+                job.factory = factory
+                self.coalesced += 1
+                return job.future
+        future = asyncio.get_running_loop().create_future()
+        # Fire-and-forget callers never read the result, so failures are only logged.
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        job = _Job(route, major, priority, factory, key, future)
+        if key is not None:
+            self._keyed[key] = job
+        self._queues[priority].append(job)
+        self._wakeup.set()
+        return future
+
+    def interaction_received(self, interaction):
+        """
+        The function registers an incoming interaction. Until it is responded to or its deadline passes,
+        user and background requests are held back.
+        """
+        self._interactions[interaction.id] = (interaction, time.monotonic() + self.interaction_deadline)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _interactions_pending(self) -> bool:
+        now = time.monotonic()
+        for interaction_id, (interaction, deadline) in list(self._interactions.items()):
+            if deadline <= now or interaction.response.is_done():
+                del self._interactions[interaction_id]
+        return bool(self._interactions)
+
+    def _bucket(self, job: _Job):
+        limit = self.route_limits.get(job.route, self.default_limit)
+        if limit is None:
+            return None
+        bucket = self._buckets.get((job.route, job.major))
+        if bucket is None:
+            bucket = self._buckets[(job.route, job.major)] = TokenBucket(*limit)
+        return bucket
+
+    def _next_job(self):
+        """
+        The function pops the first sendable job of the highest priority and returns `(job, None)`, or
+        `(None, wait)` with the seconds until something may become sendable.
+        """
+        wait = None
+        for priority, queue in self._queues.items():
+            if not queue:
+                continue
+            if priority != INTERACTION and self._interactions_pending():
+                for job in queue:
+                    if not job.deferred:
+                        job.deferred = True
+                        self.deferred_by_interaction += 1
+                return None, 0.05
+            for job in queue:
+                if job.key is not None and job.key in self._running_keys:
+                    continue
+                bucket = self._bucket(job)
+                delay = bucket.delay() if bucket is not None else 0.0
+                if delay == 0.0:
+                    queue.remove(job)
+                    if bucket is not None:
+                        bucket.take()
+                    return job, None
+                if not job.deferred:
+                    job.deferred = True
+                    self.deferred_by_bucket += 1
+                wait = delay if wait is None else min(wait, delay)
+            # Lower priorities only go out once everything above them has been sent.
+            return None, wait if wait is not None else 0.05
+        return None, wait
+
+    async def _worker(self):
+        while True:
+            job, wait = self._next_job()
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            if job.key is not None:
+                self._keyed.pop(job.key, None)
+                self._running_keys.add(job.key)
+            task = asyncio.create_task(self._run(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, job: _Job):
+        self.max_wait[job.priority] = max(self.max_wait[job.priority], time.monotonic() - job.queued)
+        try:
+            result = await job.factory()
+            self.sent[job.route] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f'Outbound {job.route} request failed: {e!r}')
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            if job.key is not None:
+                self._running_keys.discard(job.key)
+                self._wakeup.set()
+
+    def depth(self) -> dict:
+        return {priority_names[priority]: len(queue) for priority, queue in self._queues.items()}
+
+    def summary(self) -> str:
+        """
+        The function returns the queue depths and counters for display in Discord.
+        """
+        depth = self.depth()
+        return '\n'.join([
+            'outbound queue: ' + ', '.join(f'{name} {n}' for name, n in depth.items()),
+            f'sent: {sum(self.sent.values())}, failed: {self.failed}, coalesced: {self.coalesced}',
+            f'deferred for interactions: {self.deferred_by_interaction}, by rate limit: {self.deferred_by_bucket}',
+            'max wait: ' + ', '.join(f'{priority_names[p]} {w * 1000:.0f}ms' for p, w in self.max_wait.items()),
+        ])
+
+    def prometheus(self) -> str:
+        """
+        The function renders the scheduler state in the Prometheus text exposition format.
+        """
+        out = ['# HELP guppi_outbound_queue_depth Queued outbound requests.', '# TYPE guppi_outbound_queue_depth gauge']
+        out += [f'guppi_outbound_queue_depth{{priority="{name}"}} {n}' for name, n in self.depth().items()]
+        out += ['# HELP guppi_outbound_sent_total Sent outbound requests.', '# TYPE guppi_outbound_sent_total counter']
+        out += [f'guppi_outbound_sent_total{{route="{route}"}} {n}' for route, n in sorted(self.sent.items())]
+        out += [
+            '# HELP guppi_outbound_deferred_total Requests held back by an open interaction or a rate limit.',
+            '# TYPE guppi_outbound_deferred_total counter',
+            f'guppi_outbound_deferred_total{{reason="interaction"}} {self.deferred_by_interaction}',
+            f'guppi_outbound_deferred_total{{reason="rate_limit"}} {self.deferred_by_bucket}',
+            '# HELP guppi_outbound_coalesced_total Requests replaced by a later one with the same key.',
+            '# TYPE guppi_outbound_coalesced_total counter',
+            f'guppi_outbound_coalesced_total {self.coalesced}',
+            '# HELP guppi_outbound_failed_total Outbound requests that raised.',
+            '# TYPE guppi_outbound_failed_total counter',
+            f'guppi_outbound_failed_total {self.failed}',
+        ]
+        return '\n'.join(out) + '\n'
+
+outbound = OutboundScheduler()
@@ -0,0 +1,135 @@
+"""
+Process-wide settings registry. All settings are loaded in one query at startup, reads are served from
+memory and writes go through to SQLite.
+"""
+
+import inspect
+import logging
+import traceback
+from collections import defaultdict
+from utils.database import db
+
+logger = logging.getLogger()
+
+# The `Settings` class manages the bot settings stored in a SQLite database and keeps an in-memory
+# copy of them, so reading a setting never touches the database.
+class Settings:
+    setup_vars = ['bottoken', 'statuschannel_id', 'bot_status']
+    default_settings = ['Invalid', 'Invalid', 'Custom Bot status']
+
+    def __init__(self, db):
+        """
+        The function initializes the registry. Nothing is read until `load` is called.
+        """
+        self.db = db
+        self._values = {}
+        self._subscribers = defaultdict(list)
+
+    def load(self):
+        """
+        The function reads every setting in a single query and replaces the in-memory copy. It blocks
+        and is only meant to be called at boot.
+        """
+        self._values = dict(self.db.run_sync(lambda con: con.execute('SELECT setting, value FROM settings').fetchall()))
+
+    def snapshot(self) -> dict:
+        return dict(self._values)
+
+    def restore(self, values: dict):
+        """
+        The function replaces the in-memory copy with the values of a warm-restart snapshot instead of
+        calling `load`. `refresh` checks them against the database later.
+        """
+        self._values = dict(values)
+
+    async def refresh(self):
+        """
+        The function reads every setting again and notifies the subscribers of those that changed, so
+        a worker process sees settings that another worker wrote.
+        """
+        values = dict(await self.db.query('SELECT setting, value FROM settings'))
+        changed = [setting for setting, value in values.items() if self._values.get(setting) != value]
+        self._values = values
+        for setting in changed:
+            await self._notify(setting, values[setting])
+
+    def init_settings(self):
+        """
+        The function prompts the user for input if required settings are missing or invalid, and
+        updates the settings accordingly.
+        """
+        for i, s in enumerate(self.setup_vars):
+            while self.get(s) is None:
+                val = input(f'{s}:')
+                if val == '':
+                    if self.default_settings[i] == 'Invalid':
+                        continue
+                    val = self.default_settings[i]
+                self.db.run_sync(_write_setting, s, val)
+                self._values[s] = val
+                print(f'Added {s}: {val}\n')
+
+    def missing(self) -> list:
+        """
+        The function returns the required settings that have no value and no default, e.g. to fail fast
+        on a headless boot instead of prompting.
+        """
+        return [s for i, s in enumerate(self.setup_vars) if self.get(s) is None and self.default_settings[i] == 'Invalid']
+
+    def get(self, setting: str, default=None):
+        """
+        The function returns the cached value of a setting.
+        """
+        value = self._values.get(setting)
+        return default if value is None else value
+
+    @property
+    def bottoken(self):
+        return self.get('bottoken')
+
+    @property
+    def statuschannel_id(self):
+        return self.get('statuschannel_id')
+
+    @property
+    def bot_status(self):
+        return self.get('bot_status', self.default_settings[self.setup_vars.index('bot_status')])
+
+    async def update_settings(self, value: str, setting: str):
+        """
+        The function writes a setting through to the database, updates the in-memory copy and notifies
+        everyone subscribed to that setting.
+        """
+        await self.db.transaction(_write_setting, setting, value)
+        old_value = self._values.get(setting)
+        self._values[setting] = value
+        if old_value != value:
+            await self._notify(setting, value)
+
+    async def _notify(self, setting: str, value: str):
+        for callback in list(self._subscribers[setting]):
+            try:
+                result = callback(value)
+                if inspect.isawaitable(result):
+                    await result
+            except:logger.error(traceback.format_exc())
+
+    def subscribe(self, setting: str, callback):
+        """
+        The function registers `callback(value)` to be called, or awaited if it is a coroutine
+        function, whenever `setting` changes.
+        """
+        self._subscribers[setting].append(callback)
+
+    def unsubscribe(self, setting: str, callback):
+        """
+        The function removes a callback registered with `subscribe`.
+        """
+        if callback in self._subscribers[setting]:
+            self._subscribers[setting].remove(callback)
+
+def _write_setting(con, setting: str, value: str):
+    with con:
+        con.execute('INSERT INTO settings (setting, value) VALUES (?, ?) ON CONFLICT (setting) DO UPDATE SET value = excluded.value', (setting, value))
+
+settings = Settings(db)
@@ -0,0 +1,95 @@
+"""
+Worker and shard bookkeeping for running the bot as several processes. `launcher.py` starts every worker
+with its shards in environment variables, and each worker reports the state of its shards to the
+`shard_status` table so the primary worker can show all of them in the status message.
+"""
+
+import os
+import time
+import math
+
+# Exit codes of a worker that tell `launcher.py` to stop all workers. Any other code, including a crash,
+# restarts the worker.
+exit_stopped = 0
+exit_missing_settings = 2
+exit_killbot = 3
+stop_exit_codes = (exit_stopped, exit_missing_settings, exit_killbot)
+
+# The `WorkerConfig` class describes which shards the current process runs.
+class WorkerConfig:
+    def __init__(self, worker: int = 0, shard_ids: list = None, shard_count: int = None):
+        self.worker = worker
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+
+    @classmethod
+    def from_env(cls, environ=os.environ) -> 'WorkerConfig':
+        """
+        The function reads the config set by the launcher. Without it the process runs unsharded.
+        """
+        if not environ.get('GUPPI_SHARD_IDS'):
+            return cls()
+        return cls(
+            int(environ.get('GUPPI_WORKER', 0)),
+            [int(shard_id) for shard_id in environ['GUPPI_SHARD_IDS'].split(',')],
+            int(environ['GUPPI_SHARD_COUNT']),
+        )
+
+    def to_env(self) -> dict:
+        return {
+            'GUPPI_WORKER': str(self.worker),
+            'GUPPI_SHARD_IDS': ','.join(map(str, self.shard_ids)),
+            'GUPPI_SHARD_COUNT': str(self.shard_count),
+        }
+
+    @property
+    def sharded(self) -> bool:
+        return self.shard_ids is not None
+
+    @property
+    def primary(self) -> bool:
+        """
+        Only the primary worker owns the status message and the startup history.
+        """
+        return self.worker == 0
+
+    @property
+    def suffix(self) -> str:
+        """
+        The suffix for files every worker writes on its own, e.g. the log file.
+        """
+        return f'-worker{self.worker}' if self.sharded else ''
+
+def assign_shards(shard_count: int, workers: int) -> list:
+    """
+    The function splits the shards into contiguous ranges of nearly equal size, one per worker.
+    """
+    per_worker = math.ceil(shard_count / workers)
+    return [list(range(start, min(start + per_worker, shard_count))) for start in range(0, shard_count, per_worker)]
+
+def record_shards(con, worker: int, shards: list):
+    """
+    The function stores `(shard_id, guilds, latency)` of every shard of a worker.
+    """
+    now = time.time()
+    con.executemany('''INSERT INTO shard_status (shard_id, worker, pid, guilds, latency, updated_at) VALUES (?,?,?,?,?,?)
+                       ON CONFLICT (shard_id) DO UPDATE SET worker = excluded.worker, pid = excluded.pid,
+                       guilds = excluded.guilds, latency = excluded.latency, updated_at = excluded.updated_at''',
+                    [(shard_id, worker, os.getpid(), guilds, latency, now) for shard_id, guilds, latency in shards])
+
+def shard_summary(rows, shard_count: int = None, stale_after: float = 30.0) -> str:
+    """
+    The function formats the rows of `shard_status` for the status message. Shards that have not
+    reported within `stale_after` seconds are marked as offline.
+    """
+    now = time.time()
+    lines = []
+    for shard_id, worker, guilds, latency, updated_at in rows:
+        if shard_count is not None and shard_id >= shard_count:
+            continue
+        if now - updated_at > stale_after:
+            lines.append(f'#{shard_id} (worker {worker}): offline')
+        else:
+            latency = f'{latency * 1000:.0f}ms' if latency is not None and math.isfinite(latency) else '-'
+            lines.append(f'#{shard_id} (worker {worker}): {guilds} guilds, {latency}')
+    return '\n'.join(lines) or '-'
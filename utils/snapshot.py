@@ -0,0 +1,105 @@
+"""
+Warm-restart snapshots. Before the process execs itself, every registered cache is written to one
+compressed file. The new process restores the caches from it before connecting and checks them against
+the database in the background once it is ready.
+"""
+
+import os
+import time
+import zlib
+import pickle
+import logging
+import traceback
+import inspect
+
+logger = logging.getLogger()
+
+# Bump when the layout of a snapshotted cache changes, older snapshots are ignored then.
+snapshot_format = 1
+
+# The `Snapshot` class keeps the registered caches and the data restored from the last snapshot.
+class Snapshot:
+    def __init__(self, max_age: float = 120.0):
+        """
+        The function initializes an empty registry. Snapshots older than `max_age` seconds are not
+        restored, since the database may have changed a lot since.
+        """
+        self.max_age = max_age
+        self.path = None
+        self._providers = {}
+        self._pending = {}
+        self._restored = []
+
+    def load(self, path) -> bool:
+        """
+        The function reads and removes the snapshot at `path`. Its data is restored when the matching
+        cache registers. Returns True if a usable snapshot was found.
+        """
+        self.path = path
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.loads(zlib.decompress(f.read()))
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        except:
+            logger.warning(f'Ignoring unreadable snapshot: {traceback.format_exc()}')
+            return False
+        if data.get('format') != snapshot_format or time.time() - data.get('written_at', 0) > self.max_age:
+            logger.info('Ignoring outdated snapshot')
+            return False
+        self._pending = data['caches']
+        return True
+
+    def register(self, name: str, dump, restore, verify=None) -> bool:
+        """
+        The function registers a cache: `dump()` returns its picklable state, `restore(state)` puts it
+        back and the optional `verify()` checks it against the database after the bot is ready. Returns
+        True if the cache was restored from the loaded snapshot.
+        """
+        self._providers[name] = (dump, restore, verify)
+        if name not in self._pending:
+            return False
+        try:
+            restore(self._pending.pop(name))
+        except:
+            logger.warning(f'Could not restore {name} from snapshot: {traceback.format_exc()}')
+            return False
+        self._restored.append(name)
+        return True
+
+    def save(self) -> int:
+        """
+        The function writes the state of every registered cache to the snapshot file and returns its
+        size in bytes.
+        """
+        caches = {}
+        for name, (dump, restore, verify) in self._providers.items():
+            try:
+                caches[name] = dump()
+            except:logger.warning(f'Could not snapshot {name}: {traceback.format_exc()}')
+        data = zlib.compress(pickle.dumps({'format': snapshot_format, 'written_at': time.time(), 'caches': caches}, pickle.HIGHEST_PROTOCOL), 1)
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+        return len(data)
+
+    async def verify(self):
+        """
+        The function checks every restored cache against the database.
+        """
+        for name in self._restored:
+            verify = self._providers[name][2]
+            if verify is None:
+                continue
+            t = time.perf_counter()
+            try:
+                result = verify()
+                if inspect.isawaitable(result):
+                    await result
+                logger.info(f'Verified {name} from snapshot in {(time.perf_counter() - t) * 1000:.1f}ms')
+            except:logger.error(traceback.format_exc())
+        self._restored = []
+
+snapshot = Snapshot()
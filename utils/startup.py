@@ -0,0 +1,163 @@
+"""
+Boot timing: collects how long each startup phase takes and keeps the last boots in a fixed-size ring
+buffer table. `ImportProfiler` breaks the import phase down per module.
+"""
+
+import sys
+import time
+import logging
+import builtins
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger()
+
+# The `BootTimer` class collects the duration of each boot phase of the current process.
+class BootTimer:
+    def __init__(self, start: float = None):
+        """
+        The function initializes the timer. `start` is the `time.perf_counter()` value the process
+        started at.
+        """
+        self.start = time.perf_counter() if start is None else start
+        self.phases = {}
+
+    def record(self, phase: str, seconds: float):
+        """
+        The function stores the duration of a phase, keeping the first value if it is recorded twice.
+        """
+        self.phases.setdefault(phase, round(seconds, 3))
+
+    @contextmanager
+    def measure(self, phase: str):
+        """
+        The function is a context manager that records how long its body took as `phase`.
+        """
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - t)
+
+    def elapsed(self) -> float:
+        """
+        The function returns the seconds since the process started.
+        """
+        return time.perf_counter() - self.start
+
+# The `ImportProfiler` class times every import statement of the main thread while it is installed,
+# splitting each module's time into its own body and the modules it imported.
+class ImportProfiler:
+    def __init__(self):
+        self.modules = {}
+        self.top_level = 0.0
+        self._stack = []
+        self._original = None
+        self._thread = None
+
+    def start(self):
+        """
+        The function installs the profiler as `builtins.__import__`.
+        """
+        if self._original is None:
+            self._original = builtins.__import__
+            self._thread = threading.get_ident()
+            builtins.__import__ = self._import
+
+    def stop(self):
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original
+        module = sys.modules.get(name) if level == 0 else None
+        # Modules that are already imported return right away, unless submodules of a package are
+        # imported through the fromlist.
+        if (module is not None and not (fromlist and hasattr(module, '__path__'))) or threading.get_ident() != self._thread:
+            return original(name, globals, locals, fromlist, level)
+        label = name
+        if level:
+            package = (globals or {}).get('__package__') or ''
+            base = package.rsplit('.', level - 1)[0] if level > 1 else package
+            label = f'{base}.{name}' if name else base
+        if fromlist and (module is not None or not name):
+            label = f'{label} ({", ".join(fromlist)})'
+        self._stack.append(0.0)
+        t = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - t
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            else:
+                self.top_level += elapsed
+            entry = self.modules.setdefault(label, [0.0, 0.0])
+            entry[0] += elapsed
+            entry[1] += elapsed - children
+
+    def top(self, n: int = 15) -> list:
+        """
+        The function returns `(module, cumulative seconds, own seconds)` of the `n` modules that took
+        the longest themselves.
+        """
+        return sorted(((name, c, own) for name, (c, own) in self.modules.items()), key=lambda m: m[2], reverse=True)[:n]
+
+def percentile(values: list, pct: float) -> float:
+    """
+    The function returns the nearest-rank percentile of a list of numbers.
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+# The `StartupTimes` class stores the phase timings of the last `size` boots in a ring buffer table
+# and summarizes them.
+class StartupTimes:
+    def __init__(self, db, size: int = 20):
+        self.db = db
+        self.size = size
+
+    async def record_boot(self, phases: dict) -> int:
+        """
+        The function writes the phases of this boot over the oldest slot of the ring buffer in a
+        single transaction and returns the boot number.
+        """
+        def _record(con):
+            boot = con.execute('SELECT COALESCE(MAX(boot), 0) + 1 FROM startup_phases').fetchone()[0]
+            slot = boot % self.size
+            con.execute('DELETE FROM startup_phases WHERE slot = ?', (slot,))
+            con.executemany('INSERT INTO startup_phases (slot, boot, phase, seconds) VALUES (?,?,?,?)',
+                            [(slot, boot, phase, seconds) for phase, seconds in phases.items()])
+            return boot
+        return await self.db.transaction(_record)
+
+    async def retrieve_startup_times(self, phase: str = 'total') -> list:
+        """
+        The function retrieves the stored durations of one phase, oldest boot first.
+        """
+        rows = await self.db.query('SELECT seconds FROM startup_phases WHERE phase = ? ORDER BY boot', (phase,))
+        return [row[0] for row in rows]
+
+    async def phase_stats(self) -> dict:
+        """
+        The function returns `{phase: {'p50', 'p95', 'max', 'count'}}` over all stored boots, in the
+        order the phases occurred in the latest boot.
+        """
+        rows = await self.db.query('SELECT phase, seconds FROM startup_phases ORDER BY boot DESC, rowid')
+        values = {}
+        for phase, seconds in rows:
+            values.setdefault(phase, []).append(seconds)
+        return {
+            phase: {
+                'p50': percentile(v, 50),
+                'p95': percentile(v, 95),
+                'max': max(v),
+                'count': len(v),
+            }
+            for phase, v in values.items()
+        }
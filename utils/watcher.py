@@ -0,0 +1,55 @@
+"""
+Cheap source file watcher used to hot-reload cogs and restart the bot when core files change.
+"""
+
+import os
+import logging
+
+logger = logging.getLogger()
+
+# The `FileWatcher` class detects changed files by comparing their mtime and size between polls.
+# A change is only reported once the file has stopped changing for one poll, so half-written files
+# from editors or `git pull` are not picked up.
+class FileWatcher:
+    def __init__(self, paths):
+        """
+        The function initializes the watcher and takes the first snapshot of `paths`.
+        """
+        self.paths = list(paths)
+        self._known = {path: self._stat(path) for path in self.paths}
+        self._pending = {}
+
+    @staticmethod
+    def _stat(path):
+        try:
+            st = os.stat(path)
+            return (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+
+    def add(self, path):
+        """
+        The function starts watching another path.
+        """
+        if path not in self._known:
+            self.paths.append(path)
+            self._known[path] = self._stat(path)
+
+    def poll(self) -> list:
+        """
+        The function returns the paths whose mtime or size changed and have been stable since the
+        previous poll.
+        """
+        changed = []
+        for path in self.paths:
+            sig = self._stat(path)
+            if sig == self._known[path]:
+                self._pending.pop(path, None)
+                continue
+            if self._pending.get(path) == sig:
+                del self._pending[path]
+                self._known[path] = sig
+                changed.append(path)
+            else:
+                self._pending[path] = sig
+        return changed